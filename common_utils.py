@@ -3,48 +3,150 @@
 공통 유틸리티 함수들
 """
 import os
+import sys
+import logging
 import requests
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta, timezone
 import re
+import json
 import time
+import random
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 from pathlib import Path
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 
+# JSON 파싱/직렬화 (orjson이 있으면 사용, 없으면 표준 json)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# SKU 컬럼 문자열 타입 (pyarrow가 있으면 Arrow 문자열로 부분 문자열 검색 가속)
+try:
+    import pyarrow  # noqa: F401
+    SKU_DTYPE = 'string[pyarrow]'
+except ImportError:
+    SKU_DTYPE = None
+
 # .env 파일 로드
 load_dotenv()
 
+# 로그 출력 (LOG_LEVEL=DEBUG 설정 시 반복 루프 상세 로그까지 출력)
+logger = logging.getLogger('3pl')
+if not logger.handlers:
+    _log_handler = logging.StreamHandler(sys.stdout)
+    _log_handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_log_handler)
+    logger.propagate = False
+logger.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+
 # 기본 설정 - GitHub Actions에서는 임시 디렉토리 사용
 if os.getenv('GITHUB_ACTIONS'):
     # GitHub Actions 환경에서는 임시 디렉토리 사용 (업로드하지 않음)
     DOWNLOAD_DIR = "/tmp/3pl_temp"
-    print("🔒 GitHub Actions 환경: 임시 디렉토리 사용 (보안)")
+    logger.info("🔒 GitHub Actions 환경: 임시 디렉토리 사용 (보안)")
 else:
     # 로컬 환경에서는 기존 경로 사용
     DOWNLOAD_DIR = os.path.join(Path.home(), "Documents", "3pl", "daily")
 
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
+# 공용 HTTP 세션 (연결 재사용 + 429/5xx 자동 재시도)
+_SESSION = requests.Session()
+_retry = Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False)
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=_retry)
+_SESSION.mount("http://", _adapter)
+_SESSION.mount("https://", _adapter)
+
+def load_response_json(response):
+    """응답 본문 JSON 파싱 (orjson 우선)"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+def dumps_json(obj):
+    """JSON 직렬화 (orjson 우선, 요청 본문용 bytes/str 반환)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj)
+
+# 주문 페이지 병렬 조회 워커 수
+ORDER_FETCH_WORKERS = 6
+# 주문 상태 배치 업데이트 1회당 주문 수 (WooCommerce 배치 API 최대 100건)
+BATCH_UPDATE_SIZE = 100
+# 주문 상태 배치 업데이트 동시 호출 수
+BATCH_UPDATE_WORKERS = 4
+# 주문 상태 개별 변경(PUT) 동시 호출 수
+STATUS_UPDATE_WORKERS = 16
+
+def get_http_session():
+    """공용 HTTP 세션 반환 (연결 재사용 + 자동 재시도)"""
+    return _SESSION
+
+# POST 재시도 (세션 자동 재시도는 POST 제외, 429/5xx 응답은 Retry-After 우선, 없으면 지수 백오프 + 지터)
+POST_RETRY_ATTEMPTS = 5
+POST_RETRY_BACKOFF = 1.5
+POST_RETRY_AFTER_MAX = 60  # Retry-After 최대 대기 (초, CDN의 긴 값으로 실행이 멈추지 않도록 제한)
+_POST_RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+def post_with_retry(session, url, **kwargs):
+    """POST 전송 (429/5xx 응답은 대기 후 재시도, 마지막 응답 반환)"""
+    for attempt in range(1, POST_RETRY_ATTEMPTS + 1):
+        response = session.post(url, **kwargs)
+        if response.status_code not in _POST_RETRY_STATUSES or attempt == POST_RETRY_ATTEMPTS:
+            return response
+        
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            wait_time = min(int(retry_after), POST_RETRY_AFTER_MAX)
+            logger.info(f"   ⏳ {response.status_code} 응답 - Retry-After {retry_after}초 (대기 {wait_time}초) 후 재시도 ({attempt}/{POST_RETRY_ATTEMPTS - 1})")
+        else:
+            wait_time = POST_RETRY_BACKOFF * 2 ** (attempt - 1) + random.uniform(0, 1)
+            logger.info(f"   ⏳ {response.status_code} 응답 - {wait_time:.1f}초 후 재시도 ({attempt}/{POST_RETRY_ATTEMPTS - 1})")
+        time.sleep(wait_time)
+
+# 문자 판별용 정규식 (모듈 로드 시 1회 컴파일)
+_RE_HANGUL = re.compile(r'[가-힣]')
+# 한글 포함, KR 국가코드, KOREA 키워드 (대한민국/한국/SOUTH KOREA는 앞의 두 조건에 포함됨)
+_RE_KOREAN_ADDRESS = re.compile(r'[가-힣]|\bKR\b|KOREA', re.IGNORECASE)
+# 라틴 문자(확장 포함), 숫자, 기본 구두점, 공백이 아닌 문자 (한글, 한자, 가나, 아랍어, 키릴문자 등)
+_RE_NON_LATIN = re.compile(r'[^a-zA-Z0-9\s\.,\-\(\)\/\#\&\'\"\u00C0-\u00FF\u0100-\u017F]')
+
+# 문자열 정리용 정규식
+_RE_WS = re.compile(r'\s+')
+_RE_NON_BLANK = re.compile(r'\S')
+_RE_DOUBLE_COMMA = re.compile(r'\s*,\s*,\s*')
+_RE_BRACKETS = re.compile(r'\[.*?\]')
+# 사서함 주소 ('사서함', 'P.O.Box', 'P.O. Box', 'PO Box', 'POBox')
+_RE_PO_BOX = re.compile(r'사서함|P\.O\. ?Box|PO ?Box', re.IGNORECASE)
+# 한국 주소에서 제거할 국가 표기 ('KR', 'KOREA', 'South Korea' 등, 한 번의 치환으로 적용)
+_RE_KR_REMOVE = re.compile(r'\b(?:SOUTH KOREA|KOREA|KR|대한민국|한국)\b', re.IGNORECASE)
+
+@lru_cache(maxsize=8)
 def get_korean_holidays(year):
-    """Nager.Date API를 통해 한국 공휴일 정보 가져오기"""
+    """Nager.Date API를 통해 한국 공휴일 정보 가져오기 (연도별 1회만 호출)"""
     try:
-        import requests
         url = f'https://date.nager.at/api/v3/PublicHolidays/{year}/KR'
-        response = requests.get(url, timeout=10)
+        response = _SESSION.get(url, timeout=10)
         
         if response.status_code == 200:
             holidays = response.json()
             holiday_dates = {holiday['date'] for holiday in holidays}
-            print(f"📅 {year}년 한국 공휴일 {len(holiday_dates)}개 로드됨")
+            logger.info(f"📅 {year}년 한국 공휴일 {len(holiday_dates)}개 로드됨")
             return holiday_dates
         else:
-            print(f"⚠️ 공휴일 API 오류 (상태: {response.status_code}), 하드코딩된 공휴일 사용")
+            logger.warning(f"⚠️ 공휴일 API 오류 (상태: {response.status_code}), 하드코딩된 공휴일 사용")
             return get_fallback_holidays(year)
             
     except Exception as e:
-        print(f"⚠️ 공휴일 API 연결 실패: {e}, 하드코딩된 공휴일 사용")
+        logger.warning(f"⚠️ 공휴일 API 연결 실패: {e}, 하드코딩된 공휴일 사용")
         return get_fallback_holidays(year)
 
 def get_fallback_holidays(year):
@@ -70,11 +172,61 @@ def get_fallback_holidays(year):
             f"{year}-12-25"   # 크리스마스
         }
 
+# 코드 내 특정 휴무일 지정 (YYYY-MM-DD 형식)
+CUSTOM_HOLIDAYS = {
+    "2025-10-02",  # 추석 전 배송 안 함
+    # 예시: "2025-01-01",  # 신정  
+    # 예시: "2025-08-15",  # 임시 휴무
+    # 필요시 여기에 날짜 추가
+}
+
+# 지정 휴무일 date 객체 (모듈 로드 시 1회 변환)
+_CUSTOM_HOLIDAY_DATES = frozenset(datetime.strptime(d, "%Y-%m-%d").date() for d in CUSTOM_HOLIDAYS)
+
+# KST(한국 표준시) = UTC+9
+_KST = timezone(timedelta(hours=9))
+
+# 요일 이름 (0=월, 6=일)
+_WEEKDAY_SHORT = ('월', '화', '수', '목', '금', '토', '일')
+_WEEKDAY_LONG = ('월요일', '화요일', '수요일', '목요일', '금요일', '토요일', '일요일')
+
+# 공휴일 캐시 (로드된 연도의 공휴일 + 지정 휴무일을 date 집합으로 관리)
+_HOLIDAY_CACHE = set()
+_DAY_OFF_CACHE = set(_CUSTOM_HOLIDAY_DATES)
+_loaded_years = set()
+
+def _to_date(value):
+    """datetime/date 값을 date로 변환"""
+    return value.date() if isinstance(value, datetime) else value
+
+def _ensure_holidays(year):
+    """해당 연도 공휴일을 캐시에 로드 (연도별 최초 1회)"""
+    if year not in _loaded_years:
+        holidays = {datetime.strptime(d, "%Y-%m-%d").date() for d in get_korean_holidays(year)}
+        _HOLIDAY_CACHE.update(holidays)
+        _DAY_OFF_CACHE.update(holidays)
+        _loaded_years.add(year)
+
+# 마지막 작업일 역추적 최대 일수 (무한루프 방지)
+WORK_DAY_LOOKBACK_DAYS = 14
+
+def _non_business_days(before, days):
+    """기준일 직전 days일(기준일 제외) 중 휴무일(주말/공휴일/지정휴무일) 집합"""
+    base = _to_date(before)
+    window = (base - timedelta(days=i) for i in range(1, days + 1))
+    return frozenset(d for d in window if is_day_off(d))
+
 def is_holiday(date):
     """공휴일 확인 (API 기반)"""
-    year = date.year
-    holidays = get_korean_holidays(year)
-    return date.strftime("%Y-%m-%d") in holidays
+    _ensure_holidays(date.year)
+    return _to_date(date) in _HOLIDAY_CACHE
+
+def is_day_off(date):
+    """휴무일 확인 (주말/공휴일/지정휴무일)"""
+    if date.weekday() >= 5:
+        return True
+    _ensure_holidays(date.year)
+    return _to_date(date) in _DAY_OFF_CACHE
 
 def get_last_business_day(date):
     """마지막 영업일 계산"""
@@ -84,188 +236,168 @@ def get_last_business_day(date):
 
 def should_skip_today():
     """오늘 작업을 건너뛸지 확인 (공휴일/주말 체크)"""
-    # KST(한국 표준시) = UTC+9
-    kst_offset = timezone(timedelta(hours=9))
-    today_kst = datetime.now(kst_offset).date()
+    today_kst = datetime.now(_KST).date()
     
     # 요일 확인 (0=월, 6=일)
     weekday = today_kst.weekday()
-    weekday_names = ['월', '화', '수', '목', '금', '토', '일']
-    is_weekend = weekday >= 5  # 토(5), 일(6)
+    
+    logger.info(f"📅 오늘 날짜: {today_kst} ({_WEEKDAY_SHORT[weekday]}요일)")
+    
+    # 주말(토=5, 일=6)은 공휴일 조회 없이 바로 건너뛰기
+    if weekday >= 5:
+        logger.info(f"🏖️ 오늘은 주말입니다.")
+        logger.info(f"⏭️ 작업 건너뛰기: 주말")
+        return True
     
     # 공휴일 확인
     is_holiday_today = is_holiday(today_kst)
     
-    print(f"📅 오늘 날짜: {today_kst} ({weekday_names[weekday]}요일)")
-    
     if is_holiday_today:
-        print(f"🎉 오늘은 공휴일입니다.")
-    
-    if is_weekend:
-        print(f"🏖️ 오늘은 주말입니다.")
+        logger.info(f"🎉 오늘은 공휴일입니다.")
     
     # 특정 휴무일 확인
     is_custom_holiday_today = is_custom_holiday(today_kst)
     
     if is_custom_holiday_today:
-        print(f"🚫 오늘은 지정된 휴무일입니다.")
+        logger.info(f"🚫 오늘은 지정된 휴무일입니다.")
     
-    should_skip = is_holiday_today or is_weekend or is_custom_holiday_today
+    should_skip = is_holiday_today or is_custom_holiday_today
     
     if should_skip:
         skip_reason = []
         if is_holiday_today:
             skip_reason.append("공휴일")
-        if is_weekend:
-            skip_reason.append("주말")
         if is_custom_holiday_today:
             skip_reason.append("지정휴무일")
         
-        print(f"⏭️ 작업 건너뛰기: {', '.join(skip_reason)}")
+        logger.info(f"⏭️ 작업 건너뛰기: {', '.join(skip_reason)}")
         return True
     else:
-        print(f"✅ 작업 진행 가능: 평일")
+        logger.info(f"✅ 작업 진행 가능: 평일")
         return False
 
 def is_custom_holiday(date_obj):
     """특정 휴무일인지 확인 (코드 내 지정)"""
     
-    # 코드 내 특정 휴무일 지정 (YYYY-MM-DD 형식)
-    CUSTOM_HOLIDAYS = [
-        "2025-10-02",  # 추석 전 배송 안 함
-        # 예시: "2025-01-01",  # 신정  
-        # 예시: "2025-08-15",  # 임시 휴무
-        # 필요시 여기에 날짜 추가
-    ]
-    
-    date_str = date_obj.strftime('%Y-%m-%d')
-    is_custom = date_str in CUSTOM_HOLIDAYS
+    is_custom = _to_date(date_obj) in _CUSTOM_HOLIDAY_DATES
     
     if is_custom:
-        print(f"🔍 특정 휴무일 감지: {date_str}")
+        logger.info(f"🔍 특정 휴무일 감지: {date_obj.strftime('%Y-%m-%d')}")
     
     return is_custom
 
 def find_last_work_day(current_date):
     """마지막 작업일 찾기 (연속 휴무일 역추적)"""
     
-    check_date = current_date - timedelta(days=1)  # 어제부터 시작
-    days_checked = 0
+    # 역추적 범위(어제부터 최대 2주)의 휴무일만 계산 (해당 기간의 연도 공휴일만 조회)
+    non_business_days = _non_business_days(current_date, WORK_DAY_LOOKBACK_DAYS)
     
-    while days_checked < 14:  # 최대 2주까지만 역추적 (무한루프 방지)
-        # 주말인지 확인
-        if check_date.weekday() >= 5:
-            check_date -= timedelta(days=1)
-            days_checked += 1
-            continue
-        
-        # 공휴일인지 확인
-        if is_holiday(check_date):
-            check_date -= timedelta(days=1)
-            days_checked += 1
-            continue
-        
-        # 특정 휴무일인지 확인
-        if is_custom_holiday(check_date):
-            check_date -= timedelta(days=1)
-            days_checked += 1
-            continue
-        
-        # 작업일 발견
-        return check_date
+    # 어제부터 최대 2주까지만 역추적 (무한루프 방지)
+    candidates = (current_date - timedelta(days=i) for i in range(1, WORK_DAY_LOOKBACK_DAYS + 1))
     
-    # 최대 역추적 한계에 도달한 경우 기본값 반환
-    return current_date - timedelta(days=1)
+    # 주말/공휴일/특정 휴무일이 아닌 첫 날이 작업일
+    # 최대 역추적 한계에 도달한 경우 기본값(어제) 반환
+    return next((d for d in candidates if _to_date(d) not in non_business_days), current_date - timedelta(days=1))
 
 def get_date_range():
     """주문 조회 날짜 범위 계산 (연속 휴무일 고려)"""
-    # KST(한국 표준시) = UTC+9
-    kst_offset = timezone(timedelta(hours=9))
-    today_kst = datetime.now(kst_offset)
+    today_kst = datetime.now(_KST)
+    today = today_kst.date()
     
-    print(f"📅 오늘 날짜: {today_kst.strftime('%Y-%m-%d')} ({['월요일', '화요일', '수요일', '목요일', '금요일', '토요일', '일요일'][today_kst.weekday()]})")
+    logger.info(f"📅 오늘 날짜: {today} ({_WEEKDAY_LONG[today.weekday()]})")
     
     # 마지막 작업일 찾기 (연속 휴무일 역추적)
     last_work_day = find_last_work_day(today_kst)
     
-    print(f"📅 마지막 작업일: {last_work_day.strftime('%Y-%m-%d')} ({['월요일', '화요일', '수요일', '목요일', '금요일', '토요일', '일요일'][last_work_day.weekday()]})")
+    logger.info(f"📅 마지막 작업일: {last_work_day.strftime('%Y-%m-%d')} ({_WEEKDAY_LONG[last_work_day.weekday()]})")
     
     # 연속 휴무일 계산
-    days_gap = (today_kst.date() - last_work_day.date()).days
+    days_gap = (today - last_work_day.date()).days
     
     if days_gap > 1:
-        print(f"🔍 연속 휴무: {days_gap}일간 휴무 감지")
-        print(f"📈 확장 처리: {last_work_day.strftime('%Y-%m-%d')} 12시 ~ {today_kst.strftime('%Y-%m-%d')} 12시")
+        logger.info(f"🔍 연속 휴무: {days_gap}일간 휴무 감지")
+        logger.info(f"📈 확장 처리: {last_work_day.strftime('%Y-%m-%d')} 12시 ~ {today} 12시")
         
         # 확장된 범위: 마지막 작업일 12시 ~ 오늘 12시
-        start_date = last_work_day.replace(hour=12, minute=0, second=0, microsecond=0, tzinfo=kst_offset)
+        start_date = last_work_day.replace(hour=12, minute=0, second=0, microsecond=0, tzinfo=_KST)
         end_date = today_kst.replace(hour=12, minute=0, second=0, microsecond=0)
         
-        print(f"📅 확장 조회 기간: {start_date} ~ {end_date}")
-        print(f"📅 처리 기간: {days_gap}일 + {(end_date - start_date).seconds // 3600}시간")
+        logger.info(f"📅 확장 조회 기간: {start_date} ~ {end_date}")
+        logger.info(f"📅 처리 기간: {days_gap}일 + {(end_date - start_date).seconds // 3600}시간")
         
         return start_date, end_date
     else:
         # 일반 처리 (1일 차이)
-        print("📅 일반 처리: 전날 ~ 당일")
+        logger.info("📅 일반 처리: 전날 ~ 당일")
         
-        yesterday = today_kst.date() - timedelta(days=1)
-        start_date = datetime.combine(yesterday, datetime.min.time()).replace(hour=12, tzinfo=kst_offset)
+        yesterday = today - timedelta(days=1)
+        start_date = datetime(yesterday.year, yesterday.month, yesterday.day, 12, tzinfo=_KST)
         end_date = today_kst.replace(hour=12, minute=0, second=0, microsecond=0)
         
-        weekday_name = ['월', '화', '수', '목', '금', '토', '일'][today_kst.weekday()]
-        print(f"📅 {weekday_name}요일 일반 처리: 전날 ~ 당일")
-        print(f"📅 주문 조회 시간 (KST): {start_date.strftime('%Y-%m-%d %H:%M %z')} ~ {end_date.strftime('%Y-%m-%d %H:%M %z')}")
-        print(f"📅 처리 기간: 24시간")
+        weekday_name = _WEEKDAY_SHORT[today.weekday()]
+        logger.info(f"📅 {weekday_name}요일 일반 처리: 전날 ~ 당일")
+        logger.info(f"📅 주문 조회 시간 (KST): {start_date.strftime('%Y-%m-%d %H:%M %z')} ~ {end_date.strftime('%Y-%m-%d %H:%M %z')}")
+        logger.info(f"📅 처리 기간: 24시간")
         
         return start_date, end_date
 
+# 연결 테스트를 마친 (사이트, Consumer Key)
+_auth_tested = set()
+
 def get_woocommerce_auth(base_url, consumer_key, consumer_secret):
     """WooCommerce Consumer Key/Secret 인증 설정 및 테스트"""
-    print(f"🔍 WooCommerce Consumer Key/Secret 인증 준비: {base_url}")
+    logger.info(f"🔍 WooCommerce Consumer Key/Secret 인증 준비: {base_url}")
     if consumer_key and consumer_secret:
-        print(f"✅ WooCommerce 인증 정보 준비 완료: {base_url}")
-        print(f"🔍 Consumer Key: {consumer_key[:10]}...")
-        
-        # 간단한 연결 테스트
-        test_url = f"{base_url}/wp-json/wc/v3/system_status"
+        logger.info(f"✅ WooCommerce 인증 정보 준비 완료: {base_url}")
+        logger.info(f"🔍 Consumer Key: {consumer_key[:10]}...")
         
-        if base_url.startswith('https://'):
-            test_params = {
-                'consumer_key': consumer_key,
-                'consumer_secret': consumer_secret
-            }
-            test_auth = None
-        else:
-            test_params = {}
-            test_auth = (consumer_key, consumer_secret)
-        
-        try:
-            test_response = requests.get(test_url, auth=test_auth, params=test_params, timeout=10)
-            print(f"🔍 연결 테스트 응답: {test_response.status_code}")
-            if test_response.status_code == 200:
-                print(f"✅ WooCommerce API 연결 성공: {base_url}")
+        # 간단한 연결 테스트 (같은 사이트/키는 프로세스당 1회만 확인)
+        auth_key = (base_url, consumer_key)
+        if auth_key not in _auth_tested:
+            _auth_tested.add(auth_key)
+            test_url = f"{base_url}/wp-json/wc/v3/system_status"
+            
+            if base_url.startswith('https://'):
+                test_params = {
+                    'consumer_key': consumer_key,
+                    'consumer_secret': consumer_secret
+                }
+                test_auth = None
             else:
-                print(f"❌ WooCommerce API 연결 실패: {test_response.status_code}")
-        except Exception as e:
-            print(f"❌ WooCommerce API 테스트 오류: {e}")
+                test_params = {}
+                test_auth = (consumer_key, consumer_secret)
+            
+            try:
+                test_response = _SESSION.get(test_url, auth=test_auth, params=test_params, timeout=10)
+                logger.info(f"🔍 연결 테스트 응답: {test_response.status_code}")
+                if test_response.status_code == 200:
+                    logger.info(f"✅ WooCommerce API 연결 성공: {base_url}")
+                else:
+                    logger.error(f"❌ WooCommerce API 연결 실패: {test_response.status_code}")
+            except Exception as e:
+                logger.error(f"❌ WooCommerce API 테스트 오류: {e}")
         
         return (consumer_key, consumer_secret)
     else:
-        print(f"❌ WooCommerce Consumer Key 또는 Secret이 없습니다: {base_url}")
+        logger.error(f"❌ WooCommerce Consumer Key 또는 Secret이 없습니다: {base_url}")
         return None
 
+def _fetch_orders_page(orders_url, auth, headers, params, page):
+    """주문 목록 한 페이지 조회"""
+    return _SESSION.get(orders_url, auth=auth, headers=headers,
+                        params={**params, 'page': page}, timeout=30)
+
 def fetch_orders_from_wp(base_url, auth_info, start_date, end_date, status='completed'):
     """WooCommerce REST API를 통한 주문 데이터 수집"""
     orders_url = f"{base_url}/wp-json/wc/v3/orders"
     
-    print(f"🔍 WooCommerce API 호출: {base_url}")
+    logger.info(f"🔍 WooCommerce API 호출: {base_url}")
     
     consumer_key, consumer_secret = auth_info
     
     # HTTPS 사이트의 경우 URL 파라미터로 인증 정보 전달
     if base_url.startswith('https://'):
-        print(f"🔍 HTTPS 사이트 - URL 파라미터 방식 사용")
+        logger.info(f"🔍 HTTPS 사이트 - URL 파라미터 방식 사용")
         auth = None
         headers = {'Content-Type': 'application/json'}
         
@@ -273,7 +405,7 @@ def fetch_orders_from_wp(base_url, auth_info, start_date, end_date, status='comp
         start_iso = start_date.isoformat()
         end_iso = end_date.isoformat()
         
-        print(f"🔍 조회 기간 (ISO): {start_iso} ~ {end_iso}")
+        logger.info(f"🔍 조회 기간 (ISO): {start_iso} ~ {end_iso}")
         
         # 날짜 범위 파라미터 + 인증 파라미터
         params = {
@@ -286,7 +418,7 @@ def fetch_orders_from_wp(base_url, auth_info, start_date, end_date, status='comp
             'page': 1
         }
     else:
-        print(f"🔍 HTTP 사이트 - Basic Auth 방식 사용")
+        logger.info(f"🔍 HTTP 사이트 - Basic Auth 방식 사용")
         auth = auth_info
         headers = {'Content-Type': 'application/json'}
         
@@ -306,49 +438,109 @@ def fetch_orders_from_wp(base_url, auth_info, start_date, end_date, status='comp
     all_orders = []
     
     try:
-        while True:
-            response = requests.get(orders_url, auth=auth, headers=headers, params=params)
+        # 1페이지 조회 후 X-WP-TotalPages 헤더로 전체 페이지 수 확인
+        response = _fetch_orders_page(orders_url, auth, headers, params, 1)
+        
+        logger.info(f"🔍 API 응답 상태: {response.status_code}")
+        if response.status_code != 200:
+            logger.error(f"❌ 주문 데이터 수집 실패: {response.status_code}")
+            logger.error(f"❌ 응답 내용: {response.text[:500]}")
+            return all_orders
+        
+        orders = load_response_json(response)
+        all_orders.extend(orders)
+        
+        total_pages_header = response.headers.get('X-WP-TotalPages')
+        
+        if not total_pages_header:
+            # 헤더가 없으면 기존처럼 순차 조회
+            page = 1
+            while len(orders) >= params['per_page']:
+                page += 1
+                response = _fetch_orders_page(orders_url, auth, headers, params, page)
+                if response.status_code != 200:
+                    logger.error(f"❌ 주문 데이터 수집 실패: {response.status_code}")
+                    logger.error(f"❌ 응답 내용: {response.text[:500]}")
+                    break
+                orders = load_response_json(response)
+                all_orders.extend(orders)
             
-            print(f"🔍 API 응답 상태: {response.status_code}")
-            if response.status_code != 200:
-                print(f"❌ 주문 데이터 수집 실패: {response.status_code}")
-                print(f"❌ 응답 내용: {response.text[:500]}")
-                break
-                
-            orders = response.json()
-            if not orders:
-                break
-                
-            all_orders.extend(orders)
-            params['page'] += 1
+            logger.info(f"✅ 주문 데이터 수집 완료: {len(all_orders)}개")
+            return all_orders
+        
+        total_pages = int(total_pages_header)
+        
+        if total_pages > 1 and len(orders) >= params['per_page']:
+            logger.info(f"🔍 전체 {total_pages}페이지 - 2~{total_pages}페이지 병렬 조회")
             
-            # 페이지네이션 확인
-            if len(orders) < params['per_page']:
-                break
+            with ThreadPoolExecutor(max_workers=ORDER_FETCH_WORKERS) as executor:
+                futures = [
+                    executor.submit(_fetch_orders_page, orders_url, auth, headers, params, page)
+                    for page in range(2, total_pages + 1)
+                ]
+                
+                # 페이지 순서대로 결과 병합 (실패한 페이지부터는 중단)
+                for page, future in enumerate(futures, start=2):
+                    response = future.result()
+                    if response.status_code != 200:
+                        logger.error(f"❌ {page}페이지 수집 실패: {response.status_code}")
+                        logger.error(f"❌ 응답 내용: {response.text[:500]}")
+                        for pending in futures:
+                            pending.cancel()
+                        break
+                    
+                    orders = load_response_json(response)
+                    if not orders:
+                        break
+                    all_orders.extend(orders)
                 
-        print(f"✅ 주문 데이터 수집 완료: {len(all_orders)}개")
+        logger.info(f"✅ 주문 데이터 수집 완료: {len(all_orders)}개")
         return all_orders
         
     except Exception as e:
-        print(f"❌ 주문 데이터 수집 오류: {e}")
+        logger.error(f"❌ 주문 데이터 수집 오류: {e}")
         return []
 
-def convert_orders_to_dataframe(orders, site_label):
+def convert_orders_to_dataframe(orders, site_label, product_mapping=None):
     """주문 데이터를 DataFrame으로 변환 (상품명 매핑 적용)"""
     
-    # Google Sheets에서 상품명 매핑 데이터 가져오기
-    product_mapping = get_product_name_mapping()
-    
-    order_items = []
+    # 상품명 매핑 데이터 가져오기 (미리 받아둔 매핑이 있으면 재사용, 비어 있으면 재조회)
+    if not product_mapping:
+        product_mapping = get_product_name_mapping()
+    
+    # 컬럼별 리스트에 값을 모은 뒤 한 번에 DataFrame 생성
+    columns = {
+        '주문번호': [],
+        '주문상태': [],
+        'SKU': [],  # 상태 판별용 SKU (디지털/B2B/예약상품 정보 보존)
+        '상품명': [],  # 매핑된 상품명 사용
+        '품번코드': [],  # 매핑용 clean SKU (대괄호 제거)
+        '쇼핑몰상품코드': [],  # 원래 SKU 값 (하이픈 포함)
+        '수량': [],
+        '수령인명': [],
+        '수령인 연락처': [],
+        '수령인 이메일': [],  # EMS용 이메일 정보 추가
+        '우편번호': [],
+        '배송지주소': [],
+        '배송메세지': []
+    }
     
     for order in orders:
-        order_id = order.get('id', '')
+        order_id = str(order.get('id', ''))
         order_status = order.get('status', '')
+        status_display = '완료됨' if order_status == 'completed' else order_status
         
         # 배송 정보
         shipping = order.get('shipping', {})
         billing = order.get('billing', {})
         
+        # 주문 단위로 동일한 값 (상품마다 다시 계산하지 않음)
+        recipient_name = (shipping.get('first_name', '') + ' ' + shipping.get('last_name', '')).strip()
+        phone = billing.get('phone', '')
+        email = billing.get('email', '')
+        postcode = shipping.get('postcode', '')
+        address = build_clean_address(shipping)
+        
         # 고객 정보
         customer_note = order.get('customer_note', '')
         
@@ -366,117 +558,103 @@ def convert_orders_to_dataframe(orders, site_label):
             # 복합 SKU라도 전체를 하나의 상품으로 처리 (개별 분리하지 않음)
             
             # 3. 상품명 매핑용 clean_sku (대괄호까지 제거, 복합 SKU도 전체 유지)
-            import re
-            clean_sku = re.sub(r'\[.*?\]', '', sku_for_status).strip()
+            clean_sku = _RE_BRACKETS.sub('', sku_for_status).strip()
             
             # Google Sheets에서 매핑된 상품명 가져오기 (없으면 원래 상품명 사용)
             original_product_name = item.get('name', '')
             mapped_product_name = product_mapping.get(clean_sku, original_product_name)
             
             # 매핑 결과 간단 로그 (처음 3개만)
-            if len(order_items) < 3:
+            if len(columns['주문번호']) < 3:
                 if mapped_product_name != original_product_name:
-                    print(f"   📋 상품명 매핑: {clean_sku} → {mapped_product_name}")
+                    logger.debug(f"   📋 상품명 매핑: {clean_sku} → {mapped_product_name}")
                 else:
-                    print(f"   📋 매핑 없음: {clean_sku} → 원래 상품명 사용")
+                    logger.debug(f"   📋 매핑 없음: {clean_sku} → 원래 상품명 사용")
             
-            order_items.append({
-                '주문번호': str(order_id),
-                '주문상태': '완료됨' if order_status == 'completed' else order_status,
-                'SKU': sku_for_status,  # 상태 판별용 SKU (디지털/B2B/예약상품 정보 보존)
-                '상품명': mapped_product_name,  # 매핑된 상품명 사용
-                '품번코드': clean_sku,  # 매핑용 clean SKU (대괄호 제거)
-                '쇼핑몰상품코드': raw_sku,  # 원래 SKU 값 (하이픈 포함)
-                '수량': str(item.get('quantity', 1)),
-                '수령인명': (shipping.get('first_name', '') + ' ' + shipping.get('last_name', '')).strip(),
-                '수령인 연락처': billing.get('phone', ''),
-                '수령인 이메일': billing.get('email', ''),  # EMS용 이메일 정보 추가
-                '우편번호': shipping.get('postcode', ''),
-                '배송지주소': build_clean_address(shipping),
-                '배송메세지': customer_note
-            })
-    
-    df = pd.DataFrame(order_items)
-    print(f"✅ {site_label} 주문 데이터 변환 완료: {len(df)}개 항목 (상품명 매핑 적용)")
+            columns['주문번호'].append(order_id)
+            columns['주문상태'].append(status_display)
+            columns['SKU'].append(sku_for_status)
+            columns['상품명'].append(mapped_product_name)
+            columns['품번코드'].append(clean_sku)
+            columns['쇼핑몰상품코드'].append(raw_sku)
+            columns['수량'].append(str(item.get('quantity', 1)))
+            columns['수령인명'].append(recipient_name)
+            columns['수령인 연락처'].append(phone)
+            columns['수령인 이메일'].append(email)
+            columns['우편번호'].append(postcode)
+            columns['배송지주소'].append(address)
+            columns['배송메세지'].append(customer_note)
+    
+    df = pd.DataFrame(columns)
+    
+    # SKU는 태그 부분 문자열 검색([디지털]/[B2B]/[예약상품])에만 사용되므로 Arrow 문자열로 변환
+    if SKU_DTYPE:
+        df['SKU'] = df['SKU'].astype(SKU_DTYPE)
+    logger.info(f"✅ {site_label} 주문 데이터 변환 완료: {len(df)}개 항목 (상품명 매핑 적용)")
     return df
 
+def _safe_str(value):
+    """문자열은 그대로, 결측값(NaN/None)은 None, 그 외는 str로 변환"""
+    if isinstance(value, str):
+        return value
+    return None if pd.isna(value) else str(value)
+
 def is_korean_address(addr):
     """한국어 주소 확인 (한글 포함 또는 KR 국가코드)"""
-    if pd.isna(addr):
+    addr = _safe_str(addr)
+    if addr is None:
         return False
     
-    addr_str = str(addr)
-    
-    # 1. 한글이 포함된 경우
-    if re.search(r'[가-힣]', addr_str):
-        return True
-    
-    # 2. 국가코드가 KR인 경우
-    if re.search(r'\bKR\b', addr_str, re.IGNORECASE):
-        return True
-    
-    # 3. 한국 관련 키워드가 포함된 경우
-    korean_keywords = ['KOREA', 'SOUTH KOREA', '대한민국', '한국']
-    for keyword in korean_keywords:
-        if keyword in addr_str.upper():
-            return True
-    
-    return False
+    # 한글 포함 / 국가코드 KR / 한국 관련 키워드 포함
+    return bool(_RE_KOREAN_ADDRESS.search(addr))
+
+def korean_address_mask(addresses):
+    """주소 Series에서 한국 주소 여부 마스크 (is_korean_address의 벡터 연산 버전)"""
+    return addresses.str.contains(_RE_KOREAN_ADDRESS, na=False)
+
+def overseas_address_mask(addresses):
+    """주소 Series에서 비어 있지 않은 해외 주소 마스크 (NaN/공백 주소 제외)"""
+    # 공백 외 문자 존재 여부로 판정해 str.strip()의 문자열 복사 없이 빈 주소 제외
+    return addresses.str.contains(_RE_NON_BLANK, na=False) & ~korean_address_mask(addresses)
 
 def has_korean_characters(text):
     """텍스트에 한글이 포함되어 있는지 확인"""
-    if pd.isna(text):
+    text = _safe_str(text)
+    if text is None:
         return False
-    return bool(re.search(r'[가-힣]', str(text)))
+    return bool(_RE_HANGUL.search(text))
 
 def has_non_english_characters(text):
     """텍스트에 영문이 아닌 문자(일본어, 중국어 등)가 포함되어 있는지 확인"""
-    if pd.isna(text):
+    text = _safe_str(text)
+    if text is None:
         return False
     
-    text_str = str(text)
-    
-    # 1. 한글 (가-힣)
-    if re.search(r'[가-힣]', text_str):
-        return True
-    
-    # 2. 중국어/일본어 한자 (CJK Unified Ideographs)
-    if re.search(r'[\u4e00-\u9fff]', text_str):
-        return True
-    
-    # 3. 일본어 히라가나 (ひらがな)
-    if re.search(r'[\u3040-\u309f]', text_str):
-        return True
-    
-    # 4. 일본어 가타카나 (カタカナ)
-    if re.search(r'[\u30a0-\u30ff]', text_str):
-        return True
-    
-    # 5. 기타 비라틴 문자 (아랍어, 키릴문자 등)
-    # 라틴 문자(확장 포함), 숫자, 기본 구두점, 공백을 제외한 나머지
+    # 한글, 한자, 히라가나, 가타카나 및 기타 비라틴 문자 (아랍어, 키릴문자 등)
     # 라틴 확장 문자 포함 (독일어 ß, 프랑스어 é, ç 등 허용)
-    latin_extended_and_common = re.sub(r'[a-zA-Z0-9\s\.,\-\(\)\/\#\&\'\"\u00C0-\u00FF\u0100-\u017F]', '', text_str)
-    if latin_extended_and_common.strip():
-        return True
-    
-    return False
+    return bool(_RE_NON_LATIN.search(text))
+
+def _address_preview(address):
+    """로그/알림용 주소 미리보기 (50자 초과 시 생략 표시)"""
+    address = '' if pd.isna(address) else str(address)
+    return address[:50] + "..." if len(address) > 50 else address
 
 def filter_korean_recipients(df):
     """EMS 발송에서 한글 수령인명을 가진 주문들을 필터링하여 분리"""
     if df.empty:
         return df, pd.DataFrame()
     
-    # 한글 수령인명 확인
-    korean_recipients_mask = df['수령인명'].apply(has_korean_characters)
+    # 한글 수령인명 확인 (벡터 연산)
+    korean_recipients_mask = df['수령인명'].str.contains(_RE_HANGUL, na=False)
     
     # 한글 이름과 영문 이름 분리
-    korean_orders = df[korean_recipients_mask].copy()
+    korean_orders = df[korean_recipients_mask]
     valid_orders = df[~korean_recipients_mask].copy()
     
     if not korean_orders.empty:
-        print(f"⚠️ 한글 수령인명으로 인해 EMS 처리에서 제외된 주문: {len(korean_orders)}개")
-        for idx, row in korean_orders.iterrows():
-            print(f"   - 주문번호 {row['주문번호']}: '{row['수령인명']}' (주소: {str(row['배송지주소'])[:50]}...)")
+        logger.warning(f"⚠️ 한글 수령인명으로 인해 EMS 처리에서 제외된 주문: {len(korean_orders)}개")
+        for order_id, recipient, address in korean_orders[["주문번호", "수령인명", "배송지주소"]].itertuples(index=False, name=None):
+            logger.info(f"   - 주문번호 {order_id}: '{recipient}' (주소: {str(address)[:50]}...)")
     
     return valid_orders, korean_orders
 
@@ -485,28 +663,57 @@ def filter_non_english_addresses(df):
     if df.empty:
         return df, pd.DataFrame()
     
-    # 비영문 주소 확인
-    non_english_address_mask = df['배송지주소'].apply(has_non_english_characters)
+    # 비영문 주소 확인 (벡터 연산)
+    non_english_address_mask = df['배송지주소'].str.contains(_RE_NON_LATIN, na=False)
     
     # 비영문 주소와 영문 주소 분리
-    non_english_orders = df[non_english_address_mask].copy()
+    non_english_orders = df[non_english_address_mask]
     valid_orders = df[~non_english_address_mask].copy()
     
     if not non_english_orders.empty:
-        print(f"⚠️ 비영문 주소로 인해 EMS 처리에서 제외된 주문: {len(non_english_orders)}개")
-        for idx, row in non_english_orders.iterrows():
-            address_preview = str(row['배송지주소'])[:50] + "..." if len(str(row['배송지주소'])) > 50 else str(row['배송지주소'])
-            print(f"   - 주문번호 {row['주문번호']}: '{row['수령인명']}' (주소: {address_preview})")
+        logger.warning(f"⚠️ 비영문 주소로 인해 EMS 처리에서 제외된 주문: {len(non_english_orders)}개")
+        for order_id, recipient, address in non_english_orders[["주문번호", "수령인명", "배송지주소"]].itertuples(index=False, name=None):
+            logger.info(f"   - 주문번호 {order_id}: '{recipient}' (주소: {_address_preview(address)})")
     
     return valid_orders, non_english_orders
 
+def filter_ems_excluded(df):
+    """EMS 발송 제외 주문(한글 수령인명/비영문 주소)을 한 번에 분리 (유효, 한글 수령인명, 비영문 주소)"""
+    if df.empty:
+        return df, pd.DataFrame(), pd.DataFrame()
+    
+    # 두 조건을 한 번씩만 계산 (벡터 연산)
+    name_mask = df['수령인명'].str.contains(_RE_HANGUL, na=False)
+    # 한글 수령인명 주문은 비영문 주소 주문에 중복 포함하지 않음
+    address_mask = df['배송지주소'].str.contains(_RE_NON_LATIN, na=False) & ~name_mask
+    
+    # 세 결과 모두 읽기 전용으로 쓰이므로 복사 생략 (EMS 주문서는 새 DataFrame으로 구성)
+    korean_orders = df[name_mask]
+    non_english_orders = df[address_mask]
+    valid_orders = df[~(name_mask | address_mask)]
+    
+    if not korean_orders.empty:
+        logger.warning(f"⚠️ 한글 수령인명으로 인해 EMS 처리에서 제외된 주문: {len(korean_orders)}개")
+        for order_id, recipient, address in korean_orders[["주문번호", "수령인명", "배송지주소"]].itertuples(index=False, name=None):
+            logger.info(f"   - 주문번호 {order_id}: '{recipient}' (주소: {str(address)[:50]}...)")
+    
+    if not non_english_orders.empty:
+        logger.warning(f"⚠️ 비영문 주소로 인해 EMS 처리에서 제외된 주문: {len(non_english_orders)}개")
+        for order_id, recipient, address in non_english_orders[["주문번호", "수령인명", "배송지주소"]].itertuples(index=False, name=None):
+            logger.info(f"   - 주문번호 {order_id}: '{recipient}' (주소: {_address_preview(address)})")
+    
+    return valid_orders, korean_orders, non_english_orders
+
 def is_pure_digital_product(sku):
     """순수 디지털 상품인지 판별 (실물 패키지 + 디지털 보너스와 구분)"""
-    if pd.isna(sku):
+    sku_str = _safe_str(sku)
+    if sku_str is None:
         return False
-    
-    sku_str = str(sku)
-    
+    return _is_pure_digital_sku(sku_str)
+
+@lru_cache(maxsize=4096)
+def _is_pure_digital_sku(sku_str):
+    """SKU 문자열 분석 결과 캐시 (같은 SKU가 여러 주문에 반복 등장)"""
     # SKU가 [디지털]로 끝나는지 확인
     if not sku_str.endswith('[디지털]'):
         return False
@@ -514,28 +721,26 @@ def is_pure_digital_product(sku):
     # SKU 구성요소 분석
     if '/' in sku_str:
         # 복합 상품인 경우 - 실물 구성요소가 많으면 실물 패키지로 판단
-        components = sku_str.split('/')
-        physical_components = [c for c in components if not c.endswith('[디지털]')]
+        physical_count = sum(1 for c in sku_str.split('/') if not c.endswith('[디지털]'))
         
         # 실물 구성요소가 3개 이상이면 실물 패키지로 판단
-        if len(physical_components) >= 3:
-            print(f"🎯 실물 패키지 + 디지털 보너스로 판단: {sku_str[:50]}...")
+        if physical_count >= 3:
+            logger.info(f"🎯 실물 패키지 + 디지털 보너스로 판단: {sku_str[:50]}...")
             return False
     
     # 단일 상품이거나 실물 구성요소가 적으면 순수 디지털
     return True
 
+# 주소 생성에 사용하는 WooCommerce 배송 필드
+_SHIPPING_FIELDS = ('address_1', 'address_2', 'city', 'state', 'country')
+
 def build_clean_address(shipping):
     """WooCommerce 배송 정보에서 중복 없는 깔끔한 주소 생성"""
     if not shipping:
         return ""
     
     # 각 필드 추출
-    address_1 = shipping.get('address_1', '').strip()
-    address_2 = shipping.get('address_2', '').strip()
-    city = shipping.get('city', '').strip()
-    state = shipping.get('state', '').strip()
-    country = shipping.get('country', '').strip()
+    address_1, address_2, city, state, country = ((shipping.get(k) or '').strip() for k in _SHIPPING_FIELDS)
     
     # 주소 구성요소들 수집
     address_parts = []
@@ -549,8 +754,6 @@ def build_clean_address(shipping):
         address_parts.append(address_2)
     
     # 3. 지역 정보 중복 제거 처리 (개선된 로직)
-    region_parts = []
-    
     # 모든 지역 정보를 수집한 후 중복 제거
     potential_regions = []
     if state:
@@ -561,16 +764,12 @@ def build_clean_address(shipping):
         country.upper() not in ['KR', 'KOREA', 'SOUTH KOREA', '대한민국', '한국']):
         potential_regions.append(country)
     
-    # 중복 제거: 한 지역이 다른 지역에 포함되어 있으면 제거
-    for region in potential_regions:
-        is_duplicate = False
-        for other_region in potential_regions:
-            if region != other_region and region in other_region:
-                # region이 other_region에 포함되어 있으면 중복으로 간주
-                is_duplicate = True
-                break
-        if not is_duplicate:
-            region_parts.append(region)
+    # 중복 제거: 긴 지역부터 확인하여 이미 채택된 지역에 포함되어 있으면 제거 (원래 순서 유지)
+    kept = []
+    for i in sorted(range(len(potential_regions)), key=lambda i: len(potential_regions[i]), reverse=True):
+        if not any(potential_regions[i] in potential_regions[j] for j in kept):
+            kept.append(i)
+    region_parts = [potential_regions[i] for i in sorted(kept)]
     
     # 주소 구성 (한국 vs 해외 구분)
     is_korean = (state and any(keyword in state for keyword in ['도', '시', '특별시', '광역시']) or
@@ -583,85 +782,164 @@ def build_clean_address(shipping):
         # 해외 주소: 작은 단위 → 큰 단위 (상세주소 → 시 → 주/도 → 국가)
         final_parts = address_parts + region_parts
     
-    # 최종 주소 생성
-    full_address = ' '.join(final_parts).strip()
-    
-    # 연속된 공백 정리 및 추가 중복 제거
-    full_address = re.sub(r'\s+', ' ', full_address)
+    # 최종 주소 생성 (split()으로 연속된 공백도 함께 정리)
+    words = ' '.join(final_parts).split()
     
     # 같은 단어가 연속으로 나오는 경우 제거 (예: "서울시 서울시" → "서울시")
-    words = full_address.split()
-    cleaned_words = []
-    for word in words:
-        if not cleaned_words or word != cleaned_words[-1]:
-            cleaned_words.append(word)
-    
-    return ' '.join(cleaned_words)
+    return ' '.join(w for i, w in enumerate(words) if i == 0 or w != words[i - 1])
 
 def clean_korean_address(addr):
     """한국 주소에서 불필요한 'KR' 제거"""
-    if pd.isna(addr):
+    cleaned = _safe_str(addr)
+    if cleaned is None:
         return addr
     
     # 'KR', 'KOREA', 'South Korea' 등 제거
-    cleaned = str(addr)
-    patterns_to_remove = [
-        r'\bKR\b',
-        r'\bKOREA\b', 
-        r'\bSOUTH KOREA\b',
-        r'\b대한민국\b',
-        r'\b한국\b'
-    ]
-    
-    for pattern in patterns_to_remove:
-        cleaned = re.sub(pattern, '', cleaned, flags=re.IGNORECASE)
+    cleaned = _RE_KR_REMOVE.sub('', cleaned)
     
     # 연속된 공백과 콤마 정리
-    cleaned = re.sub(r'\s*,\s*,\s*', ', ', cleaned)
-    cleaned = re.sub(r'\s+', ' ', cleaned)
+    cleaned = _RE_DOUBLE_COMMA.sub(', ', cleaned)
+    cleaned = _RE_WS.sub(' ', cleaned)
     cleaned = cleaned.strip(' ,')
     
     return cleaned
 
-def apply_string_format(filepath, columns):
-    """Excel 파일의 특정 컬럼을 문자열 형식으로 변경"""
+def clean_korean_addresses(addresses):
+    """주소 Series에서 불필요한 'KR' 제거 (clean_korean_address의 벡터 연산 버전, 문자열 주소 전용)"""
+    cleaned = addresses.str.replace(_RE_KR_REMOVE, '', regex=True)
+    
+    # 연속된 공백과 콤마 정리
+    cleaned = cleaned.str.replace(_RE_DOUBLE_COMMA, ', ', regex=True)
+    cleaned = cleaned.str.replace(_RE_WS, ' ', regex=True)
+    return cleaned.str.strip(' ,')
+
+def save_excel_with_string_format(df, filepath, columns, append=False):
+    """DataFrame을 Excel로 저장하면서 특정 컬럼을 문자열 형식으로 기록 (write-only 스트리밍, 기록한 행 수 반환)"""
     try:
-        from openpyxl import load_workbook
+        from openpyxl import Workbook, load_workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, Border, Font, Side
     except ImportError:
-        print("❌ openpyxl 패키지가 설치되지 않았습니다. pip install openpyxl을 실행해주세요.")
-        return
+        logger.error("❌ openpyxl 패키지가 설치되지 않았습니다. pip install openpyxl을 실행해주세요.")
+        return 0
     
-    try:
-        wb = load_workbook(filepath)
-        ws = wb.active
-        col_idx = {cell.value: idx + 1 for idx, cell in enumerate(ws[1])}
-        
-        for col in columns:
-            if col in col_idx:
-                for row in ws.iter_rows(min_row=2, min_col=col_idx[col], max_col=col_idx[col]):
-                    for cell in row:
-                        cell.number_format = '@'
-        
-        wb.save(filepath)
-        print(f"✅ Excel 형식 적용 완료: {filepath}")
-    except Exception as e:
-        print(f"❌ Excel 형식 적용 실패: {e}")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet1')
+    
+    # 헤더 (pandas to_excel 기본 헤더 스타일과 동일)
+    header_font = Font(bold=True)
+    thin = Side(style='thin')
+    header_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    header_alignment = Alignment(horizontal='center', vertical='top')
+    header = []
+    for name in df.columns:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.font = header_font
+        cell.border = header_border
+        cell.alignment = header_alignment
+        header.append(cell)
+    ws.append(header)
+    
+    text_positions = {idx for idx, name in enumerate(df.columns) if name in columns}
+    
+    def write_row(row):
+        values = []
+        for idx, value in enumerate(row):
+            # 결측값은 빈 셀로 기록
+            if not isinstance(value, str) and pd.isna(value):
+                value = None
+            if idx in text_positions:
+                value = WriteOnlyCell(ws, value=value)
+                value.number_format = '@'
+            values.append(value)
+        ws.append(values)
+    
+    row_count = 0
+    
+    # 기존 파일 행을 DataFrame으로 만들지 않고 그대로 이어 쓰기 (컬럼명 기준으로 순서 맞춤)
+    if append and os.path.exists(filepath):
+        old_wb = load_workbook(filepath, read_only=True)
+        try:
+            old_rows = old_wb.active.iter_rows(values_only=True)
+            old_header = next(old_rows, ())
+            positions = [old_header.index(name) if name in old_header else None for name in df.columns]
+            for old_row in old_rows:
+                write_row(tuple(
+                    old_row[pos] if pos is not None and pos < len(old_row) else None
+                    for pos in positions
+                ))
+                row_count += 1
+        finally:
+            old_wb.close()
+    
+    for row in df.itertuples(index=False, name=None):
+        write_row(row)
+        row_count += 1
+    
+    wb.save(filepath)
+    return row_count
+
+# EMS 주문서 문자열 형식 컬럼
+EMS_STRING_COLUMNS = ["수량", "수령인연락처1", "수령인연락처2", "우편번호"]
+
+# 사이트별 EMS 주문 (모든 사이트 처리 후 flush_ems_orders에서 한 번에 저장)
+_ems_pending = []
+
+def get_ems_path():
+    """오늘 날짜 EMS 통합 주문서 경로"""
+    today_str = datetime.today().strftime('%y%m%d')
+    return f"{DOWNLOAD_DIR}/{today_str} 노이지콘텐츠주문서(EMS).xlsx"
+
+def queue_ems_orders(ems_df):
+    """EMS 통합 주문서에 저장할 주문 추가 (저장은 flush_ems_orders에서)"""
+    if not ems_df.empty:
+        _ems_pending.append(ems_df)
+
+def flush_ems_orders():
+    """대기 중인 EMS 주문을 한 번에 합쳐 기존 EMS 파일 뒤에 저장 (저장 경로 반환)"""
+    if not _ems_pending:
+        return None
+    
+    ems_path = get_ems_path()
+    columns = _ems_pending[0].columns
+    homogeneous = all(
+        frame.columns.equals(columns) and (frame.dtypes == object).all()
+        for frame in _ems_pending
+    )
+    if homogeneous:
+        # 모든 컬럼이 문자열(object)이면 배열을 바로 이어 붙임 (블록 재구성 없음)
+        merged = pd.DataFrame(np.concatenate([frame.to_numpy() for frame in _ems_pending]), columns=columns)
+    else:
+        merged = pd.concat(_ems_pending, ignore_index=True, copy=False)
+    _ems_pending.clear()
+    
+    ems_count = save_excel_with_string_format(merged, ems_path, EMS_STRING_COLUMNS, append=True)
+    logger.info(f"📦 EMS 주문서 저장 완료: 신규 {len(merged)}건, 전체 {ems_count}건 - {ems_path}")
+    return ems_path
+
+# 상품명 매핑 캐시 (실행 중 재사용, 1시간 후 만료)
+PRODUCT_MAPPING_TTL = 3600
+_mapping_cache = None
+_mapping_ts = 0
 
 def get_product_name_mapping():
-    """Supabase에서 품번코드-상품명 매핑 데이터 가져오기"""
+    """Supabase에서 품번코드-상품명 매핑 데이터 가져오기 (1시간 캐시)"""
+    global _mapping_cache, _mapping_ts
+    
+    if _mapping_cache is not None and time.time() - _mapping_ts < PRODUCT_MAPPING_TTL:
+        return _mapping_cache
     
-    print("📋 상품명 매핑 데이터 가져오는 중 (Supabase)...")
+    logger.info("📋 상품명 매핑 데이터 가져오는 중 (Supabase)...")
     
     try:
-        import requests
         
         # Supabase 환경변수
         supabase_url = os.getenv('SUPABASE_URL')
         supabase_key = os.getenv('SUPABASE_KEY')
         
         if not supabase_url or not supabase_key:
-            print("❌ Supabase 환경변수가 설정되지 않았습니다")
-            print("   필요한 환경변수: SUPABASE_URL, SUPABASE_KEY")
+            logger.error("❌ Supabase 환경변수가 설정되지 않았습니다")
+            logger.info("   필요한 환경변수: SUPABASE_URL, SUPABASE_KEY")
             return {}
         
         # Supabase REST API 호출
@@ -677,123 +955,122 @@ def get_product_name_mapping():
             "select": "품번코드,상품명"
         }
         
-        response = requests.get(api_url, headers=headers, params=params, timeout=15)
+        response = _SESSION.get(api_url, headers=headers, params=params, timeout=15)
         
         if response.status_code == 200:
-            data = response.json()
+            data = load_response_json(response)
             
             if not data:
-                print("❌ Supabase에서 매핑 데이터가 없습니다")
+                logger.error("❌ Supabase에서 매핑 데이터가 없습니다")
                 return {}
             
             # 매핑 딕셔너리 생성 {품번코드: 상품명}
-            mapping = {}
-            for row in data:
-                product_code = str(row.get('품번코드', '')).strip()
-                product_name = str(row.get('상품명', '')).strip()
-                
-                if product_code and product_name:
-                    mapping[product_code] = product_name
+            pairs = ((str(row.get('품번코드', '')).strip(), str(row.get('상품명', '')).strip()) for row in data)
+            mapping = {code: name for code, name in pairs if code and name}
+            
+            logger.info(f"✅ Supabase 상품명 매핑 데이터 로드 완료: {len(mapping)}개")
             
-            print(f"✅ Supabase 상품명 매핑 데이터 로드 완료: {len(mapping)}개")
+            # 정상 로드된 경우에만 캐시 (실패 시 다음 호출에서 재시도)
+            _mapping_cache = mapping
+            _mapping_ts = time.time()
             return mapping
             
         else:
-            print(f"❌ Supabase API 호출 실패: {response.status_code}")
-            print(f"❌ 응답: {response.text[:200]}")
+            logger.error(f"❌ Supabase API 호출 실패: {response.status_code}")
+            logger.error(f"❌ 응답: {response.text[:200]}")
             return {}
             
     except Exception as e:
-        print(f"❌ Supabase 상품명 매핑 데이터 로드 실패: {e}")
+        logger.error(f"❌ Supabase 상품명 매핑 데이터 로드 실패: {e}")
         return {}
 
-def update_orders_batch(order_ids, status, base_url, consumer_key, consumer_secret):
-    """여러 주문 상태 배치 업데이트 (20개씩 안전하게 처리)"""
-    import requests
-    import json
-    import time
-    
-    if not order_ids:
-        return 0
-    
-    print(f"🔄 배치 업데이트 시작: {len(order_ids)}개 주문 → {status} 상태")
-    
-    # 20개씩 나누어 처리 (API 안정성)
-    batch_size = 20
-    total_updated = 0
-    total_failed = 0
+def _post_order_batch(batch, batch_num, total_batches, status, base_url, consumer_key, consumer_secret):
+    """주문 배치 업데이트 1회 호출 (변경 성공한 주문 ID 목록 반환)"""
+    logger.debug(f"   📦 배치 {batch_num}/{total_batches}: {len(batch)}개 주문 처리 중...")
+    
+    # 배치 업데이트 데이터 구성
+    batch_data = {
+        "update": [
+            {"id": int(order_id), "status": status} 
+            for order_id in batch
+        ]
+    }
     
-    for i in range(0, len(order_ids), batch_size):
-        batch = order_ids[i:i+batch_size]
-        batch_num = (i // batch_size) + 1
-        total_batches = (len(order_ids) + batch_size - 1) // batch_size
-        
-        print(f"   📦 배치 {batch_num}/{total_batches}: {len(batch)}개 주문 처리 중...")
-        
-        # 배치 업데이트 데이터 구성
-        batch_data = {
-            "update": [
-                {"id": int(order_id), "status": status} 
-                for order_id in batch
-            ]
-        }
+    try:
+        # WooCommerce 배치 API 호출
+        batch_url = f"{base_url}/wp-json/wc/v3/orders/batch"
         
-        try:
-            # WooCommerce 배치 API 호출
-            batch_url = f"{base_url}/wp-json/wc/v3/orders/batch"
-            
-            if base_url.startswith('https://'):
-                params = {
+        if base_url.startswith('https://'):
+            request_kwargs = {
+                'params': {
                     'consumer_key': consumer_key,
                     'consumer_secret': consumer_secret
                 }
-                response = requests.post(
-                    batch_url,
-                    params=params,
-                    headers={'Content-Type': 'application/json'},
-                    data=json.dumps(batch_data),
-                    timeout=30
-                )
-            else:
-                auth = (consumer_key, consumer_secret)
-                response = requests.post(
-                    batch_url,
-                    auth=auth,
-                    headers={'Content-Type': 'application/json'},
-                    data=json.dumps(batch_data),
-                    timeout=30
-                )
-            
-            if response.status_code == 200:
-                result = response.json()
-                updated_orders = result.get('update', [])
-                
-                success_count = 0
-                for updated_order in updated_orders:
-                    if updated_order.get('id'):
-                        success_count += 1
-                
-                total_updated += success_count
-                failed_count = len(batch) - success_count
-                total_failed += failed_count
-                
-                print(f"   ✅ 배치 {batch_num} 완료: {success_count}개 성공, {failed_count}개 실패")
-                
-            else:
-                print(f"   ❌ 배치 {batch_num} API 오류: {response.status_code}")
-                print(f"   ❌ 응답: {response.text[:200]}")
-                total_failed += len(batch)
-                
-        except Exception as e:
-            print(f"   ❌ 배치 {batch_num} 처리 오류: {e}")
-            total_failed += len(batch)
+            }
+        else:
+            request_kwargs = {'auth': (consumer_key, consumer_secret)}
         
-        # 배치 간 잠시 대기 (API 제한 방지)
-        if i + batch_size < len(order_ids):
-            time.sleep(0.5)
-    
-    print(f"🎉 배치 업데이트 완료: {total_updated}개 성공, {total_failed}개 실패")
-    return total_updated
+        # API 제한(429)/일시 오류(5xx)는 대기 후 재시도 (Retry-After는 최대 대기 시간으로 제한)
+        response = post_with_retry(
+            _SESSION,
+            batch_url,
+            headers={'Content-Type': 'application/json'},
+            data=dumps_json(batch_data),
+            timeout=30,
+            **request_kwargs
+        )
+        
+        if response.status_code == 200:
+            result = load_response_json(response)
+            
+            # 항목별 오류가 없는 주문만 성공으로 집계
+            updated_ids = [
+                updated_order['id'] for updated_order in result.get('update', [])
+                if updated_order.get('id') and 'error' not in updated_order
+            ]
+            
+            logger.debug(f"   ✅ 배치 {batch_num} 완료: {len(updated_ids)}개 성공, {len(batch) - len(updated_ids)}개 실패")
+            return updated_ids
+            
+        else:
+            logger.error(f"   ❌ 배치 {batch_num} API 오류: {response.status_code}")
+            logger.error(f"   ❌ 응답: {response.text[:200]}")
+            return []
+            
+    except Exception as e:
+        logger.error(f"   ❌ 배치 {batch_num} 처리 오류: {e}")
+        return []
+
+def update_orders_batch_ids(order_ids, status, base_url, consumer_key, consumer_secret):
+    """여러 주문 상태 배치 업데이트 (변경 성공한 주문 ID 집합 반환)"""
+    # 같은 주문의 여러 상품 행이 들어오므로 주문 ID 중복 제거 (순서 유지)
+    order_ids = list(dict.fromkeys(int(order_id) for order_id in order_ids))
+    if not order_ids:
+        return set()
+    
+    logger.info(f"🔄 배치 업데이트 시작: {len(order_ids)}개 주문 → {status} 상태")
+    
+    # WooCommerce 배치 API 최대 건수 단위로 나누어 처리
+    batches = [order_ids[i:i + BATCH_UPDATE_SIZE] for i in range(0, len(order_ids), BATCH_UPDATE_SIZE)]
+    total_batches = len(batches)
+    updated_ids = set()
+    
+    # 배치끼리는 서로 독립적이므로 동시에 호출 (고정 대기 없음)
+    with ThreadPoolExecutor(max_workers=BATCH_UPDATE_WORKERS) as executor:
+        futures = [
+            executor.submit(_post_order_batch, batch, batch_num, total_batches,
+                            status, base_url, consumer_key, consumer_secret)
+            for batch_num, batch in enumerate(batches, start=1)
+        ]
+        for future in as_completed(futures):
+            updated_ids.update(future.result())
+    
+    logger.info(f"🎉 배치 업데이트 완료: {len(updated_ids)}개 성공, {len(order_ids) - len(updated_ids)}개 실패")
+    return updated_ids
+
+def update_orders_batch(order_ids, status, base_url, consumer_key, consumer_secret):
+    """여러 주문 상태 배치 업데이트 (성공 건수 반환)"""
+    return len(update_orders_batch_ids(order_ids, status, base_url, consumer_key, consumer_secret))
 
 class ProcessingResults:
     """3PL 처리 결과 수집 클래스"""
@@ -853,11 +1130,11 @@ class ProcessingResults:
         issue_details.append(f"이상 발견: {site_name} 해외 발송 명단 - 수령인의 이름이 한글로 확인")
         issue_details.append(f"제외된 주문 {len(korean_orders_df)}개:")
         
-        for idx, row in korean_orders_df.iterrows():
-            order_id = row.get('주문번호', 'N/A')
-            recipient = row.get('수령인명', 'N/A')
-            address = str(row.get('배송지주소', ''))[:50] + "..." if len(str(row.get('배송지주소', ''))) > 50 else str(row.get('배송지주소', ''))
-            issue_details.append(f"  • 주문번호 {order_id}: '{recipient}' → {address}")
+        rows = korean_orders_df.reindex(columns=["주문번호", "수령인명", "배송지주소"])
+        for order_id, recipient, address in rows.itertuples(index=False, name=None):
+            order_id = 'N/A' if pd.isna(order_id) else order_id
+            recipient = 'N/A' if pd.isna(recipient) else recipient
+            issue_details.append(f"  • 주문번호 {order_id}: '{recipient}' → {_address_preview(address)}")
         
         issue_details.append("※ EMS는 영문 수령인명만 허용되므로 해당 주문들은 주문서에서 제외되었습니다.")
         
@@ -872,11 +1149,11 @@ class ProcessingResults:
         issue_details.append(f"이상 발견: {site_name} 해외 발송 명단 - 주소에 비영문 문자 확인")
         issue_details.append(f"제외된 주문 {len(non_english_orders_df)}개:")
         
-        for idx, row in non_english_orders_df.iterrows():
-            order_id = row.get('주문번호', 'N/A')
-            recipient = row.get('수령인명', 'N/A')
-            address = str(row.get('배송지주소', ''))[:50] + "..." if len(str(row.get('배송지주소', ''))) > 50 else str(row.get('배송지주소', ''))
-            issue_details.append(f"  • 주문번호 {order_id}: '{recipient}' → {address}")
+        rows = non_english_orders_df.reindex(columns=["주문번호", "수령인명", "배송지주소"])
+        for order_id, recipient, address in rows.itertuples(index=False, name=None):
+            order_id = 'N/A' if pd.isna(order_id) else order_id
+            recipient = 'N/A' if pd.isna(recipient) else recipient
+            issue_details.append(f"  • 주문번호 {order_id}: '{recipient}' → {_address_preview(address)}")
         
         issue_details.append("※ EMS는 영문 주소만 허용되므로 해당 주문들은 관리자 확인이 필요합니다.")
         
@@ -925,45 +1202,42 @@ def filter_po_box_orders(df):
     if df.empty:
         return df, None
     
-    # 사서함 관련 키워드로 필터링 (대소문자 구분 없음, 정규식 이스케이프 처리)
-    po_box_keywords = [
-        '사서함',
-        r'P\.O\.Box',     # P.O.Box (점을 이스케이프)
-        r'P\.O\. Box',    # P.O. Box (점을 이스케이프)
-        'PO Box',         # PO Box
-        'POBox',          # POBox
-        'po box'          # po box
-    ]
-    
-    # 주소 컬럼에서 사서함 키워드 검색 (정규식 사용)
-    po_box_pattern = '|'.join(po_box_keywords)
-    po_box_mask = df['배송지주소'].str.contains(po_box_pattern, case=False, na=False, regex=True)
-    
-    # 사서함 주문 분리
-    po_box_orders = df[po_box_mask].copy()
-    regular_orders = df[~po_box_mask].copy()
+    # 'box' / '사서함' 부분 문자열로 후보만 먼저 고른 뒤 후보에만 정규식 적용
+    addresses = df['배송지주소']
+    candidate_mask = (
+        addresses.str.contains('box', case=False, regex=False, na=False) |
+        addresses.str.contains('사서함', regex=False, na=False)
+    )
+    po_box_mask = pd.Series(False, index=df.index)
+    if candidate_mask.any():
+        # bool 배열로 대입 (Series를 대입하면 object 타입이 되어 ~ 연산이 정수 반전으로 바뀜)
+        po_box_mask[candidate_mask] = addresses[candidate_mask].str.contains(_RE_PO_BOX, na=False).to_numpy(dtype=bool)
+    
+    # 사서함 주문 분리 (사서함 주문은 저장만, 일반 주문은 하위 처리에서 각자 복사하므로 복사 생략)
+    po_box_orders = df[po_box_mask]
+    regular_orders = df[~po_box_mask]
     
     po_box_file_path = None
     
     if not po_box_orders.empty:
-        print(f"📮 사서함 주소 주문 {len(po_box_orders)}개 발견")
+        logger.info(f"📮 사서함 주소 주문 {len(po_box_orders)}개 발견")
         
         # 현재 날짜로 파일명 생성
         today_str = datetime.now().strftime('%y%m%d')
         po_box_file_path = os.path.join(DOWNLOAD_DIR, f"우체국용_사서함_주문_{today_str}.xlsx")
         
         try:
-            # 엑셀 파일로 저장
-            po_box_orders.to_excel(po_box_file_path, index=False, engine='openpyxl')
-            print(f"📮 사서함 주문 저장 완료: {po_box_file_path}")
+            # 엑셀 파일로 저장 (write-only 스트리밍, 문자열 형식 지정 컬럼 없음)
+            save_excel_with_string_format(po_box_orders, po_box_file_path, [])
+            logger.info(f"📮 사서함 주문 저장 완료: {po_box_file_path}")
             
             # 처리 결과에 추가
             processing_results.add_warning(f"사서함 주소 주문 {len(po_box_orders)}개 별도 처리")
             
         except Exception as e:
-            print(f"❌ 사서함 주문 파일 저장 실패: {e}")
+            logger.error(f"❌ 사서함 주문 파일 저장 실패: {e}")
             po_box_file_path = None
     else:
-        print("✅ 사서함 주소 주문 없음")
+        logger.info("✅ 사서함 주소 주문 없음")
     
     return regular_orders, po_box_file_path
@@ -4,7 +4,7 @@
 """
 import pandas as pd
 from datetime import datetime
-from common_utils import DOWNLOAD_DIR, is_korean_address, clean_korean_address, apply_string_format, processing_results
+from common_utils import DOWNLOAD_DIR, korean_address_mask, clean_korean_addresses, save_excel_with_string_format, processing_results
 
 def process_dok_domestic_orders(df):
     """독독독 국내 주문서 처리"""
@@ -15,19 +15,20 @@ def process_dok_domestic_orders(df):
     
     print("--- 독독독 국내 주문서 작성 시작 ---")
     
-    # 국내 주소만 필터링
-    domestic = df[df["배송지주소"].apply(is_korean_address)].copy()
+    # 국내 주소 / B2B·디지털 상품 제외 마스크 (전체 SKU 문자열에서 확인, 복사는 최종 결과 1회)
+    domestic_mask = korean_address_mask(df["배송지주소"])
     
-    if domestic.empty:
+    if not domestic_mask.any():
         print("✅ 독독독: 국내 배송 주문 없음")
         processing_results.add_domestic_orders(0)
         return
     
-    # B2B 상품 및 디지털 상품 제외 (전체 SKU 문자열에서 확인)
-    domestic = domestic[
-        (~domestic["SKU"].str.contains("\\[B2B\\]", na=False)) &
-        (~domestic["SKU"].str.contains("\\[디지털\\]", na=False))
-    ].copy()
+    sku = df["SKU"]
+    domestic_mask &= ~(
+        sku.str.contains("[B2B]", regex=False, na=False) |
+        sku.str.contains("[디지털]", regex=False, na=False)
+    )
+    domestic = df[domestic_mask].copy()
     
     if domestic.empty:
         print("✅ 독독독: B2B 제외 후 국내 주문 없음")
@@ -41,10 +42,10 @@ def process_dok_domestic_orders(df):
     domestic["국가코드"] = ""
     
     # 주문번호 접두사 추가 (독독독은 "D")
-    domestic["주문번호"] = domestic["주문번호"].apply(lambda x: "D" + str(x))
+    domestic["주문번호"] = "D" + domestic["주문번호"].astype(str)
     
     # 국내 주소에서 "KR" 제거
-    domestic["배송지주소"] = domestic["배송지주소"].apply(clean_korean_address)
+    domestic["배송지주소"] = clean_korean_addresses(domestic["배송지주소"])
     
     # 최종 컬럼 선택
     domestic = domestic[[
@@ -59,8 +60,8 @@ def process_dok_domestic_orders(df):
     today_str = datetime.today().strftime('%y%m%d')
     dom_path = f"{DOWNLOAD_DIR}/{today_str} 노이지콘텐츠주문서(독독독_국내).xlsx"
     
-    domestic.to_excel(dom_path, index=False)
-    apply_string_format(dom_path, ["수량", "수령인연락처1", "수령인연락처2", "우편번호"])
+    # 문자열 형식 컬럼을 지정하며 한 번에 기록 (저장 후 다시 열어 형식 적용하지 않음)
+    save_excel_with_string_format(domestic, dom_path, ["수량", "수령인연락처1", "수령인연락처2", "우편번호"])
     print(f"📦 독독독 국내 주문서 저장 완료: {len(domestic)}건 - {dom_path}")
     
     # 결과 수집
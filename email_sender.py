@@ -4,10 +4,13 @@
 """
 import smtplib
 import os
+import atexit
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
-from email import encoders
 from email.header import Header
 from datetime import datetime
 from dotenv import load_dotenv
@@ -23,8 +26,121 @@ DRIVE_SCOPES = [
     'https://www.googleapis.com/auth/drive'
 ]
 
+# Excel(xlsx) 파일 MIME 타입 (Drive 업로드/메일 첨부 공용)
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Shared Drive 검색 공통 옵션
+_SHARED_DRIVE_LIST_KW = {'supportsAllDrives': True, 'includeItemsFromAllDrives': True}
+
+# Google Drive 배치 요청당 최대 요청 수 (API 제한)
+DRIVE_BATCH_SIZE = 100
+
+# Google Drive 동시 업로드 수 (사용자당 쓰기 할당량 고려해 소수로 제한)
+DRIVE_UPLOAD_WORKERS = int(os.getenv('DRIVE_UPLOAD_CONCURRENCY', '3'))
+# Drive 요청 재시도 횟수 (429/5xx 응답 시 지수 백오프)
+DRIVE_NUM_RETRIES = 3
+# 재개 가능 업로드 기준 크기/청크 크기 (작은 파일은 세션 생성 왕복 없이 단일 요청)
+DRIVE_RESUMABLE_THRESHOLD = 5 * 1024 * 1024
+DRIVE_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Google Drive 인증 정보/서비스 캐시 (프로세스당 1회 인증 후 재사용)
+_drive_credentials = None
+_drive_service = None
+# 업로드 스레드별 Drive 서비스 (httplib2 연결은 스레드 간 공유 불가)
+_drive_local = threading.local()
+
+# 암묵적 TLS(SMTPS) 포트
+SMTP_SSL_PORT = 465
+
+# SMTP 연결 캐시 (배송 주문서/처리 결과 메일이 같은 연결 재사용)
+_smtp_connection = None
+_smtp_key = None
+
+def _close_smtp():
+    """캐시된 SMTP 연결 종료"""
+    global _smtp_connection, _smtp_key
+    if _smtp_connection is not None:
+        try:
+            _smtp_connection.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+    _smtp_connection = None
+    _smtp_key = None
+
+atexit.register(_close_smtp)
+
+def _get_smtp(smtp_server, smtp_port, sender_email, sender_password):
+    """SMTP 연결 반환 (프로세스당 1회 접속/STARTTLS/로그인 후 재사용)"""
+    global _smtp_connection, _smtp_key
+    key = (smtp_server, smtp_port, sender_email)
+    
+    if _smtp_connection is not None and _smtp_key == key:
+        try:
+            if _smtp_connection.noop()[0] == 250:
+                return _smtp_connection
+        except (smtplib.SMTPException, OSError):
+            pass
+    _close_smtp()
+    
+    # 465 포트는 접속 즉시 TLS (STARTTLS 왕복 생략), 그 외 포트는 STARTTLS
+    if smtp_port == SMTP_SSL_PORT:
+        server = smtplib.SMTP_SSL(smtp_server, smtp_port)
+    else:
+        server = smtplib.SMTP(smtp_server, smtp_port)
+        server.starttls()
+    server.login(sender_email, sender_password)
+    
+    _smtp_connection = server
+    _smtp_key = key
+    return server
+
+def _send_smtp_message(msg, smtp_server, smtp_port, sender_email, sender_password, recipient_email):
+    """캐시된 SMTP 연결로 메일 발송 (NOOP 이후 끊긴 경우 1회 재접속 후 재발송)"""
+    server = _get_smtp(smtp_server, smtp_port, sender_email, sender_password)
+    try:
+        server.send_message(msg, from_addr=sender_email, to_addrs=recipient_email)
+    except smtplib.SMTPServerDisconnected:
+        _close_smtp()
+        server = _get_smtp(smtp_server, smtp_port, sender_email, sender_password)
+        server.send_message(msg, from_addr=sender_email, to_addrs=recipient_email)
+
+# 첨부 파일 base64 인코딩 단위 (57바이트 = 인코딩 후 76자 1줄)
+ATTACHMENT_CHUNK_SIZE = 57 * 1024
+
+def _encoded_attachment(file_path, mimetype):
+    """파일을 조각 단위로 읽어 base64 인코딩한 첨부 파트 생성 (원본 전체를 메모리에 두지 않음)"""
+    encoded = bytearray()
+    with open(file_path, "rb") as attachment:
+        while True:
+            chunk = attachment.read(ATTACHMENT_CHUNK_SIZE)
+            if not chunk:
+                break
+            encoded.extend(base64.encodebytes(chunk))
+    
+    part = MIMEBase(*mimetype.split('/', 1))
+    part.set_payload(encoded.decode('ascii'))
+    part['Content-Transfer-Encoding'] = 'base64'
+    return part
+
+def _build_drive_service(credentials):
+    """Drive 서비스 생성 (라이브러리 내장 discovery 문서 사용, 네트워크 조회/파일 캐시 없음)"""
+    return build('drive', 'v3', credentials=credentials,
+                 cache_discovery=False, static_discovery=True)
+
+def _thread_drive_service():
+    """현재 업로드 스레드 전용 Drive 서비스 반환 (스레드당 1회 생성)"""
+    service = getattr(_drive_local, 'service', None)
+    if service is None:
+        service = _build_drive_service(_drive_credentials)
+        _drive_local.service = service
+    return service
+
 def authenticate_google_drive():
-    """Google Drive API 인증"""
+    """Google Drive API 인증 (생성된 서비스는 캐시하여 재사용)"""
+    global _drive_credentials, _drive_service
+    if _drive_service is not None:
+        return _drive_service
+    
     try:
         # Google Service Account 환경변수 로드 (tracking_updater.py와 동일)
         project_id = os.getenv('GOOGLE_PROJECT_ID')
@@ -51,53 +167,78 @@ def authenticate_google_drive():
         }
         
         # 인증 정보 생성
-        credentials = service_account.Credentials.from_service_account_info(
+        _drive_credentials = service_account.Credentials.from_service_account_info(
             service_account_info, scopes=DRIVE_SCOPES
         )
         
-        # Drive 서비스 생성
-        drive_service = build('drive', 'v3', credentials=credentials)
+        _drive_service = _build_drive_service(_drive_credentials)
         
-        return drive_service
+        return _drive_service
         
     except Exception as e:
         print(f"⚠️ Google Drive 인증 실패: {e}")
         return None
 
-def upload_to_google_drive(file_path, folder_id):
-    """파일을 Google Drive 폴더에 업로드 (Shared Drive 지원, 같은 이름 파일 있으면 덮어쓰기)"""
-    drive_service = authenticate_google_drive()
+def _drive_file_list_request(drive_service, filename, folder_id):
+    """폴더 내 같은 이름 파일 검색 요청 생성 (Shared Drive 방식)"""
+    query = f"name='{filename}' and '{folder_id}' in parents and trashed=false"
+    return drive_service.files().list(
+        q=query, 
+        fields='files(id,name)',
+        **_SHARED_DRIVE_LIST_KW
+    )
+
+def find_existing_drive_files(drive_service, filenames, folder_id):
+    """여러 파일의 기존 파일 검색을 배치 요청으로 묶어 조회 ({파일명: 파일 ID 또는 None})"""
+    existing = {}
     
-    if not drive_service:
-        return False
+    def _callback(request_id, response, exception):
+        # 조회 실패한 파일은 결과에서 빠지고 업로드 시 개별 조회
+        if exception is None:
+            files = response.get('files', [])
+            existing[request_id] = files[0]['id'] if files else None
+    
+    filenames = list(dict.fromkeys(filenames))
+    for i in range(0, len(filenames), DRIVE_BATCH_SIZE):
+        batch = drive_service.new_batch_http_request(callback=_callback)
+        for filename in filenames[i:i + DRIVE_BATCH_SIZE]:
+            batch.add(_drive_file_list_request(drive_service, filename, folder_id), request_id=filename)
+        try:
+            batch.execute()
+        except Exception as e:
+            print(f"⚠️ Google Drive 기존 파일 일괄 조회 실패: {e}")
     
+    return existing
+
+def upload_to_google_drive(drive_service, file_path, folder_id, existing_ids=None):
+    """파일을 Google Drive 폴더에 업로드 (Shared Drive 지원, 같은 이름 파일 있으면 덮어쓰기)"""
     try:
         filename = os.path.basename(file_path)
         
-        # 기존 파일 검색 (Shared Drive 방식)
-        query = f"name='{filename}' and '{folder_id}' in parents and trashed=false"
-        existing_files = drive_service.files().list(
-            q=query, 
-            fields='files(id,name)',
-            supportsAllDrives=True,
-            includeItemsFromAllDrives=True
-        ).execute()
+        # 기존 파일 검색 (일괄 조회 결과가 없으면 개별 조회)
+        if existing_ids is not None and filename in existing_ids:
+            existing_file_id = existing_ids[filename]
+        else:
+            existing_files = _drive_file_list_request(drive_service, filename, folder_id).execute(num_retries=DRIVE_NUM_RETRIES)
+            existing_file_id = existing_files['files'][0]['id'] if existing_files['files'] else None
         
         # 미디어 업로드 설정 (Excel 파일)
+        # 큰 파일은 재개 가능한 청크 업로드 (실패 시 남은 청크만 재전송, execute가 청크 반복 처리)
         media = MediaFileUpload(
             file_path,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            mimetype=XLSX_MIMETYPE,
+            chunksize=DRIVE_UPLOAD_CHUNK_SIZE,
+            resumable=os.path.getsize(file_path) > DRIVE_RESUMABLE_THRESHOLD
         )
         
-        if existing_files['files']:
+        if existing_file_id:
             # 기존 파일이 있으면 업데이트 (덮어쓰기)
-            existing_file_id = existing_files['files'][0]['id']
             file = drive_service.files().update(
                 fileId=existing_file_id,
                 media_body=media,
                 supportsAllDrives=True,
                 fields='id,name,webViewLink'
-            ).execute()
+            ).execute(num_retries=DRIVE_NUM_RETRIES)
             print(f"☁️ Google Drive 파일 업데이트 완료: {filename}")
         else:
             # 새 파일 생성 (Shared Drive 방식)
@@ -110,7 +251,7 @@ def upload_to_google_drive(file_path, folder_id):
                 media_body=media,
                 supportsAllDrives=True,
                 fields='id,name,webViewLink'
-            ).execute()
+            ).execute(num_retries=DRIVE_NUM_RETRIES)
             print(f"☁️ Google Drive 새 파일 업로드 완료: {filename}")
         
         print(f"   파일 ID: {file.get('id')}")
@@ -132,14 +273,35 @@ def backup_files_to_drive(file_paths):
     
     print(f"☁️ Google Drive 백업 시작... ({len(file_paths)}개 파일)")
     
-    success_count = 0
+    # 인증은 파일마다 반복하지 않고 1회만 수행
+    drive_service = authenticate_google_drive()
+    if not drive_service:
+        return False
+    
+    upload_paths = []
     for file_path in file_paths:
         if os.path.exists(file_path):
-            if upload_to_google_drive(file_path, backup_folder_id):
-                success_count += 1
+            upload_paths.append(file_path)
         else:
             print(f"⚠️ 파일 없음: {file_path}")
     
+    # 기존 파일 존재 여부는 배치 요청 1회로 조회 (업로드 자체는 배치 불가)
+    existing_ids = find_existing_drive_files(
+        drive_service,
+        [os.path.basename(p) for p in upload_paths],
+        backup_folder_id
+    )
+    
+    # 업로드는 네트워크 대기 위주이므로 스레드별 서비스로 병렬 처리
+    def _upload(file_path):
+        return upload_to_google_drive(_thread_drive_service(), file_path, backup_folder_id, existing_ids)
+    
+    success_count = 0
+    if upload_paths:
+        workers = max(1, min(DRIVE_UPLOAD_WORKERS, len(upload_paths)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            success_count = sum(executor.map(_upload, upload_paths))
+    
     print(f"☁️ Google Drive 백업 완료: {success_count}/{len(file_paths)}개 성공")
     return success_count > 0
 
@@ -183,57 +345,55 @@ def send_shipping_files_email(file_paths, recipient_email=None):
         msg['To'] = recipient_email
         msg['Subject'] = f"{today_str} 발송"
         
+        # 첨부 대상 파일 확인 (파일당 존재 확인/파일명 추출 1회)
+        entries = []
+        for file_path in file_paths:
+            if os.path.exists(file_path):
+                entries.append((file_path, os.path.basename(file_path)))
+            else:
+                print(f"⚠️ 파일 없음: {file_path}")
+        
         # 메일 본문
-        body = """배송지를 하기와 같이 첨부합니다. 감사합니다.
+        body_parts = ["""배송지를 하기와 같이 첨부합니다. 감사합니다.
 
-첨부 파일:"""
+첨부 파일:"""]
         
         # 첨부 파일 목록 추가
-        for file_path in file_paths:
-            filename = os.path.basename(file_path)
-            body += f"\n- {filename}"
+        body_parts.extend(f"\n- {filename}" for _, filename in entries)
         
-        body += f"""
+        body_parts.append(f"""
 
 발송 일시: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 처리 시스템: 3PL 자동화 시스템
-"""
+""")
+        body = ''.join(body_parts)
         
         msg.attach(MIMEText(body, 'plain', 'utf-8'))
         
         # 파일 첨부
         attached_count = 0
-        for file_path in file_paths:
-            if os.path.exists(file_path):
-                filename = os.path.basename(file_path)
-                
-                with open(file_path, "rb") as attachment:
-                    # Excel 파일의 올바른 MIME 타입 설정
-                    part = MIMEBase('application', 'vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-                    part.set_payload(attachment.read())
-                
-                encoders.encode_base64(part)
-                
-                # 파일명 인코딩 (한글 파일명 지원)
-                encoded_filename = urllib.parse.quote(filename)
-                
-                # 올바른 파일명과 확장자 설정 (RFC 2231 방식)
-                part.add_header(
-                    'Content-Disposition',
-                    f'attachment; filename*=UTF-8\'\'{encoded_filename}'
-                )
-                
-                # 추가 헤더로 파일명 명시 (호환성)
-                part.add_header(
-                    'Content-Type', 
-                    f'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet; name*=UTF-8\'\'{encoded_filename}'
-                )
-                
-                msg.attach(part)
-                attached_count += 1
-                print(f"📎 첨부 파일 추가: {filename}")
-            else:
-                print(f"⚠️ 파일 없음: {file_path}")
+        for file_path, filename in entries:
+            # Excel 파일의 올바른 MIME 타입 설정
+            part = _encoded_attachment(file_path, XLSX_MIMETYPE)
+            
+            # 파일명 인코딩 (한글 파일명 지원)
+            encoded_filename = urllib.parse.quote(filename)
+            
+            # 올바른 파일명과 확장자 설정 (RFC 2231 방식)
+            part.add_header(
+                'Content-Disposition',
+                f'attachment; filename*=UTF-8\'\'{encoded_filename}'
+            )
+            
+            # 추가 헤더로 파일명 명시 (호환성)
+            part.add_header(
+                'Content-Type', 
+                f'{XLSX_MIMETYPE}; name*=UTF-8\'\'{encoded_filename}'
+            )
+            
+            msg.attach(part)
+            attached_count += 1
+            print(f"📎 첨부 파일 추가: {filename}")
         
         if attached_count == 0:
             print("❌ 첨부할 파일이 없습니다.")
@@ -242,13 +402,7 @@ def send_shipping_files_email(file_paths, recipient_email=None):
         # SMTP 서버 연결 및 발송
         print(f"📧 이메일 발송 중... ({recipient_email})")
         
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        
-        text = msg.as_string()
-        server.sendmail(sender_email, recipient_email, text)
-        server.quit()
+        _send_smtp_message(msg, smtp_server, smtp_port, sender_email, sender_password, recipient_email)
         
         print(f"✅ 이메일 발송 완료!")
         print(f"📧 수신자: {recipient_email}")
@@ -259,6 +413,8 @@ def send_shipping_files_email(file_paths, recipient_email=None):
         
     except Exception as e:
         print(f"❌ 이메일 발송 실패: {e}")
+        # 연결 상태를 알 수 없으므로 다음 발송 시 새로 접속
+        _close_smtp()
         return False
 
 def collect_shipping_files():
@@ -274,12 +430,18 @@ def collect_shipping_files():
         f"{today_str} 노이지콘텐츠주문서(EMS).xlsx"
     ]
     
+    # 디렉토리를 한 번만 읽어 파일 존재 여부 확인 (폴더가 없으면 파일 없음으로 처리)
+    try:
+        with os.scandir(DOWNLOAD_DIR) as entries:
+            file_entries = {entry.name: entry.path for entry in entries if entry.is_file()}
+    except FileNotFoundError:
+        file_entries = {}
+    
     existing_files = []
     
     for pattern in file_patterns:
-        file_path = os.path.join(DOWNLOAD_DIR, pattern)
-        if os.path.exists(file_path):
-            existing_files.append(file_path)
+        if pattern in file_entries:
+            existing_files.append(file_entries[pattern])
             print(f"📦 발송 대상 파일: {pattern}")
         else:
             print(f"⚠️ 파일 없음: {pattern}")
@@ -335,39 +497,32 @@ def send_processing_result_email(result_summary, po_box_file_path=None):
         # 사서함 주문 파일 첨부 (있는 경우)
         if po_box_file_path and os.path.exists(po_box_file_path):
             try:
-                with open(po_box_file_path, "rb") as attachment:
-                    part = MIMEBase('application', 'octet-stream')
-                    part.set_payload(attachment.read())
-                    encoders.encode_base64(part)
-                    
-                    filename = os.path.basename(po_box_file_path)
-                    encoded_filename = urllib.parse.quote(filename)
-                    
-                    part.add_header(
-                        'Content-Disposition',
-                        f'attachment; filename*=UTF-8\'\'{encoded_filename}'
-                    )
-                    msg.attach(part)
-                    print(f"📎 사서함 주문 파일 첨부: {filename}")
+                part = _encoded_attachment(po_box_file_path, 'application/octet-stream')
+                
+                filename = os.path.basename(po_box_file_path)
+                encoded_filename = urllib.parse.quote(filename)
+                
+                part.add_header(
+                    'Content-Disposition',
+                    f'attachment; filename*=UTF-8\'\'{encoded_filename}'
+                )
+                msg.attach(part)
+                print(f"📎 사서함 주문 파일 첨부: {filename}")
             except Exception as e:
                 print(f"⚠️ 사서함 파일 첨부 실패: {e}")
         
         # SMTP 서버 연결 및 발송
         print(f"📧 처리 결과 이메일 발송 중... ({recipient_email})")
         
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        
-        text = msg.as_string()
-        server.sendmail(sender_email, recipient_email, text)
-        server.quit()
+        _send_smtp_message(msg, smtp_server, smtp_port, sender_email, sender_password, recipient_email)
         
         print(f"✅ 처리 결과 이메일 발송 완료!")
         return True
         
     except Exception as e:
         print(f"❌ 처리 결과 이메일 발송 실패: {e}")
+        # 연결 상태를 알 수 없으므로 다음 발송 시 새로 접속
+        _close_smtp()
         return False
 
 if __name__ == "__main__":
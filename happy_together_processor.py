@@ -3,151 +3,182 @@
 해피투게더 스타터팩 자동 주문 생성 시스템
 """
 import os
-import requests
 import re
+import time
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
 import json
 from dotenv import load_dotenv
+from common_utils import logger, get_http_session, load_response_json, dumps_json
 
 load_dotenv()
 
+# 미니학습지 WooCommerce / WP 관리자(Application Password) 인증 정보 (모듈 로드 시 1회 조회)
+_WOO_CFG = (
+    os.getenv('WP_BASE_URL'),
+    os.getenv('WP_WOO_CONSUMER_KEY'),
+    os.getenv('WP_WOO_CONSUMER_SECRET')
+)
+_WP_APP_CFG = (
+    os.getenv('WP_BASE_URL'),
+    os.getenv('WP_APP_USER'),
+    os.getenv('WP_APP_PASSWORD')
+)
+HAPPY_TOGETHER_PRODUCT_ID = os.getenv('HAPPY_TOGETHER_PRODUCT_ID')
+
+# 이메일 정규표현식 (모듈 로드 시 1회 컴파일, ASCII 모드라 한글과 붙어 있어도 단어 경계로 인식)
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b', re.ASCII)
+
 def extract_email_from_customer_note(note):
     """고객 메모에서 이메일 추출"""
     if not note:
         return None
     
-    # 이메일 정규표현식
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    emails = re.findall(email_pattern, note)
+    match = _EMAIL_RE.search(note)  # 첫 번째 이메일 사용
     
-    if emails:
-        email = emails[0]  # 첫 번째 이메일 사용
-        print(f"📧 고객 메모에서 이메일 추출: {email}")
+    if match:
+        email = match.group()
+        logger.info(f"📧 고객 메모에서 이메일 추출: {email}")
         return email
     else:
-        print("⚠️ 고객 메모에서 이메일을 찾을 수 없습니다")
+        logger.warning("⚠️ 고객 메모에서 이메일을 찾을 수 없습니다")
         return None
 
+# 상품 옵션 메타 키 → 옵션 이름 (정확한 키 매칭)
+_OPTION_META_KEYS = {
+    '첫-번째-언어': 'first_language',
+    '두-번째-언어': 'second_language',
+    '원하는 학습지 유형을 선택하세요!': 'paper_type',
+    'pa_paper-type': 'paper_type',
+}
+
 def analyze_product_options(line_item):
     """상품 옵션 분석"""
-    meta_data = line_item.get('meta_data', [])
-    
     options = {}
-    for meta in meta_data:
-        key = meta['key']
-        value = meta['value']
-        
-        # 정확한 옵션 키 매칭
-        if key == '첫-번째-언어':
-            options['first_language'] = value
-        elif key == '두-번째-언어':
-            options['second_language'] = value
-        elif key == '원하는 학습지 유형을 선택하세요!' or key == 'pa_paper-type':
-            options['paper_type'] = value
+    for meta in line_item.get('meta_data', []):
+        # 키당 문자열 비교 대신 dict 조회 1회 (키/값 누락 메타도 오류 없이 건너뜀)
+        option_name = _OPTION_META_KEYS.get(meta.get('key'))
+        if option_name:
+            options[option_name] = meta.get('value')
     
     return options
 
+# 해피투게더 대상 상품명 키워드
+STARTER_PACK_KEYWORD = "스타터팩"
+
+# 학습지 유형별 상품명 템플릿 (paperdigital 또는 기타는 기본 템플릿)
+_PRODUCT_NAME_TEMPLATES = {
+    'digital': "1&1-{lang} 스타터팩[디지털학습지]",
+    'digitalonly': "1&1-{lang} 스타터팩[디지털학습지]",
+}
+_DEFAULT_PRODUCT_NAME_TEMPLATE = "1&1-{lang} 스타터팩"
+
 def determine_product_variation(second_language, paper_type):
     """상품 옵션에 따른 상품명 결정"""
     
     # 실제 학습지 유형에 따른 상품명 결정
-    if paper_type == 'digital' or paper_type == 'digitalonly':
-        product_name = f"1&1-{second_language} 스타터팩[디지털학습지]"
-    else:  # paperdigital 또는 기타
-        product_name = f"1&1-{second_language} 스타터팩"
+    template = _PRODUCT_NAME_TEMPLATES.get(paper_type, _DEFAULT_PRODUCT_NAME_TEMPLATE)
+    product_name = template.format(lang=second_language)
     
-    print(f"📋 상품명 결정: {paper_type} → {product_name}")
+    logger.debug(f"📋 상품명 결정: {paper_type} → {product_name}")
     return product_name
 
 def get_wp_user_id_by_email(email):
     """WP Users API로 이메일 기반 user_id 찾기 (관리자 Application Password 인증)"""
+    session = get_http_session()
     
-    base_url = os.getenv('WP_BASE_URL')
-    admin_user = os.getenv('WP_APP_USER')
-    app_password = os.getenv('WP_APP_PASSWORD')
+    base_url, admin_user, app_password = _WP_APP_CFG
     
     if not all([base_url, admin_user, app_password]):
-        print("❌ WordPress Application Password 환경변수가 설정되지 않았습니다")
+        logger.error("❌ WordPress Application Password 환경변수가 설정되지 않았습니다")
         return None
     
-    print(f"🔍 WP Users API로 이메일 검색: {email}")
+    logger.debug(f"🔍 WP Users API로 이메일 검색: {email}")
     
     try:
-        response = requests.get(
+        response = session.get(
             f"{base_url}/wp-json/wp/v2/users",
-            params={"search": email, "per_page": 100, "context": "edit"},
+            # 이메일 컬럼만 검색하고 필요한 필드만 응답 (정확 매칭은 아래에서 확인)
+            params={
+                "search": email,
+                "search_columns": "email",
+                "per_page": 10,
+                "context": "edit",
+                "_fields": "id,email,name"
+            },
             auth=(admin_user, app_password), 
             timeout=15
         )
         
-        print(f"WP Users API 응답 상태: {response.status_code}")
+        logger.debug(f"WP Users API 응답 상태: {response.status_code}")
         
         if response.status_code != 200:
-            print(f"❌ WP Users API 실패: {response.status_code}")
-            print(f"❌ 응답: {response.text[:200]}")
+            logger.error(f"❌ WP Users API 실패: {response.status_code}")
+            logger.error(f"❌ 응답: {response.text[:200]}")
             return None
             
-        users = response.json()
-        print(f"검색된 사용자 수: {len(users)}")
+        users = load_response_json(response)
+        logger.debug(f"검색된 사용자 수: {len(users)}")
         
         # 이메일 정확 매칭
+        email_lower = email.lower()
         for user in users:
             user_email = user.get("email", "")
-            if user_email.lower() == email.lower():
+            if user_email.lower() == email_lower:
                 user_id = user.get("id")
                 user_name = user.get("name", "")
-                print(f"✅ WordPress 사용자 발견!")
-                print(f"  User ID: {user_id}")
-                print(f"  이메일: {user_email}")
-                print(f"  이름: {user_name}")
+                logger.info(f"✅ WordPress 사용자 발견!")
+                logger.debug(f"  User ID: {user_id}")
+                logger.debug(f"  이메일: {user_email}")
+                logger.debug(f"  이름: {user_name}")
                 return user_id
         
-        print(f"📭 해당 이메일의 WordPress 사용자를 찾을 수 없습니다: {email}")
+        logger.info(f"📭 해당 이메일의 WordPress 사용자를 찾을 수 없습니다: {email}")
         return None
         
     except Exception as e:
-        print(f"❌ WP Users API 오류: {e}")
+        logger.error(f"❌ WP Users API 오류: {e}")
         return None
 
 
 def ensure_wc_customer_by_user_id(user_id, email, first_name=""):
     """WooCommerce 고객 레코드 보장 (없으면 초기화)"""
+    session = get_http_session()
     
-    base_url = os.getenv('WP_BASE_URL')
-    consumer_key = os.getenv('WP_WOO_CONSUMER_KEY')
-    consumer_secret = os.getenv('WP_WOO_CONSUMER_SECRET')
+    base_url, consumer_key, consumer_secret = _WOO_CFG
     
-    print(f"🔄 WooCommerce 고객 레코드 확인/초기화: User ID {user_id}")
+    logger.debug(f"🔄 WooCommerce 고객 레코드 확인/초기화: User ID {user_id}")
     
     # 1. 우선 GET /customers/{id} 시도
     customer_url = f"{base_url}/wp-json/wc/v3/customers/{user_id}"
     params = {"consumer_key": consumer_key, "consumer_secret": consumer_secret}
     
     try:
-        response = requests.get(customer_url, params=params, timeout=15)
+        response = session.get(customer_url, params=params, timeout=15)
         
         if response.status_code == 200:
-            customer = response.json()
-            print(f"✅ 기존 WooCommerce 고객 발견: ID {user_id}")
+            customer = load_response_json(response)
+            logger.info(f"✅ 기존 WooCommerce 고객 발견: ID {user_id}")
             return user_id
         
-        print(f"📭 WooCommerce 고객 레코드 없음 (상태: {response.status_code}) - 초기화 시도")
+        logger.info(f"📭 WooCommerce 고객 레코드 없음 (상태: {response.status_code}) - 초기화 시도")
         
         # 2. 없으면 최소 정보로 초기화 (PUT 권장)
         payload = {"email": email}
         if first_name:
             payload["first_name"] = first_name
         
-        put_response = requests.put(customer_url, params=params, json=payload, timeout=15)
+        put_response = session.put(customer_url, params=params, json=payload, timeout=15)
         
         if put_response.status_code in (200, 201):
-            print(f"✅ WooCommerce 고객 초기화 성공 (PUT): ID {user_id}")
+            logger.info(f"✅ WooCommerce 고객 초기화 성공 (PUT): ID {user_id}")
             return user_id
         
-        print(f"⚠️ PUT 실패 ({put_response.status_code}) - POST로 재시도")
+        logger.warning(f"⚠️ PUT 실패 ({put_response.status_code}) - POST로 재시도")
         
         # 3. PUT가 막혀있으면 POST로도 시도
         customers_url = f"{base_url}/wp-json/wc/v3/customers"
-        post_response = requests.post(
+        post_response = session.post(
             customers_url, 
             params=params, 
             json={"email": email, "first_name": first_name}, 
@@ -155,30 +186,39 @@ def ensure_wc_customer_by_user_id(user_id, email, first_name=""):
         )
         
         if post_response.status_code in (200, 201):
-            created_id = post_response.json().get("id", user_id)
-            print(f"✅ WooCommerce 고객 생성 성공 (POST): ID {created_id}")
+            created_id = load_response_json(post_response).get("id", user_id)
+            logger.info(f"✅ WooCommerce 고객 생성 성공 (POST): ID {created_id}")
             return created_id
         
-        print(f"❌ WooCommerce 고객 초기화 완전 실패:")
-        print(f"  PUT: {put_response.status_code} - {put_response.text[:200]}")
-        print(f"  POST: {post_response.status_code} - {post_response.text[:200]}")
+        logger.error(f"❌ WooCommerce 고객 초기화 완전 실패:")
+        logger.error(f"  PUT: {put_response.status_code} - {put_response.text[:200]}")
+        logger.error(f"  POST: {post_response.status_code} - {post_response.text[:200]}")
         return None
         
     except Exception as e:
-        print(f"❌ WooCommerce 고객 초기화 오류: {e}")
+        logger.error(f"❌ WooCommerce 고객 초기화 오류: {e}")
         return None
 
 
+# 이메일별 고객 조회 결과 캐시 (같은 친구 이메일 반복 시 REST 재조회 방지, 30분 후 만료)
+CUSTOMER_LOOKUP_TTL = 1800
+_customer_cache = {}
+
 def find_user_by_stable_flow(email):
-    """안정적인 사용자 찾기 플로우 (WP Users → WooCommerce 고객 보장)"""
+    """안정적인 사용자 찾기 플로우 (WP Users → WooCommerce 고객 보장, 30분 캐시)"""
+    cache_key = email.lower()
+    cached = _customer_cache.get(cache_key)
+    if cached is not None and time.time() - cached['ts'] < CUSTOMER_LOOKUP_TTL:
+        logger.debug(f"♻️ 캐시된 사용자 정보 사용: {email} (ID {cached['id']})")
+        return {k: cached[k] for k in ('id', 'name', 'email')}
     
-    print(f"🚀 안정적인 플로우로 사용자 검색: {email}")
+    logger.debug(f"🚀 안정적인 플로우로 사용자 검색: {email}")
     
     # 1단계: WP Users API로 user_id 찾기
     wp_user_id = get_wp_user_id_by_email(email)
     
     if not wp_user_id:
-        print(f"📭 WordPress 사용자 없음 - 신규 사용자로 처리")
+        logger.info(f"📭 WordPress 사용자 없음 - 신규 사용자로 처리")
         return None
     
     # 2단계: WooCommerce 고객 레코드 보장
@@ -186,73 +226,77 @@ def find_user_by_stable_flow(email):
     customer_id = ensure_wc_customer_by_user_id(wp_user_id, email, first_name)
     
     if customer_id:
-        print(f"🎉 안정적 플로우 성공: User ID {customer_id}")
+        logger.info(f"🎉 안정적 플로우 성공: User ID {customer_id}")
+        # 성공한 조회만 캐시 (일시적 실패는 다음 호출에서 재시도)
+        _customer_cache[cache_key] = {"id": customer_id, "name": first_name, "email": email, "ts": time.time()}
         return {
             "id": customer_id,
             "name": first_name,
             "email": email
         }
     else:
-        print(f"❌ WooCommerce 고객 초기화 실패 - 게스트로 폴백")
+        logger.error(f"❌ WooCommerce 고객 초기화 실패 - 게스트로 폴백")
         return None
 
 
+# 중복 친구 주문 확인 기간 (일)
+FRIEND_ORDER_LOOKBACK_DAYS = 30
+
 def check_if_friend_order_exists(original_order_id, friend_email):
     """meta_data의 원본_주문번호로 중복 주문 확인"""
+    session = get_http_session()
     
-    base_url = os.getenv('WP_BASE_URL')
-    consumer_key = os.getenv('WP_WOO_CONSUMER_KEY')
-    consumer_secret = os.getenv('WP_WOO_CONSUMER_SECRET')
+    base_url, consumer_key, consumer_secret = _WOO_CFG
     
-    # 최근 주문들에서 원본 주문번호가 메타데이터에 있는지 확인
+    # 친구 이메일로 검색한 최근 주문들에서 원본 주문번호가 메타데이터에 있는지 확인 (서버 측 필터링)
     orders_url = f"{base_url}/wp-json/wc/v3/orders"
-    params = {
-        'consumer_key': consumer_key,
-        'consumer_secret': consumer_secret,
-        'per_page': 50,  # 최근 50개 주문 확인
+    after = (datetime.now(timezone.utc) - timedelta(days=FRIEND_ORDER_LOOKBACK_DAYS)).strftime('%Y-%m-%dT%H:%M:%S')
+    query = {
+        'search': friend_email,
+        'after': after,
+        'per_page': 20,
         'orderby': 'date',
-        'order': 'desc'
+        'order': 'desc',
+        '_fields': 'id,billing,line_items'  # 필요한 필드만 응답
     }
     
     try:
         if base_url.startswith('https://'):
-            full_params = {**params}
-            response = requests.get(orders_url, params=full_params, timeout=15)
+            params = {'consumer_key': consumer_key, 'consumer_secret': consumer_secret, **query}
+            response = session.get(orders_url, params=params, timeout=15)
         else:
             auth = (consumer_key, consumer_secret)
-            response = requests.get(orders_url, params={'per_page': 50, 'orderby': 'date', 'order': 'desc'}, auth=auth, timeout=15)
+            response = session.get(orders_url, params=query, auth=auth, timeout=15)
         
         if response.status_code == 200:
-            orders = response.json()
+            friend_email_lower = friend_email.lower()
+            original_id = str(original_order_id)
             
-            for order in orders:
-                # 고객 이메일 확인
-                billing_email = order.get('billing', {}).get('email', '')
-                
-                if billing_email.lower() == friend_email.lower():
-                    # 해당 주문의 line_items에서 원본_주문번호 메타데이터 확인
-                    for item in order.get('line_items', []):
-                        for meta in item.get('meta_data', []):
-                            if (meta.get('key') == '원본_주문번호' and 
-                                str(meta.get('value')) == str(original_order_id)):
-                                print(f"⚠️ 이미 생성된 친구 주문 발견: {order['id']}")
-                                return order['id']
+            for order in load_response_json(response):
+                # search는 부분 일치이므로 청구 이메일 정확히 확인
+                if order.get('billing', {}).get('email', '').lower() != friend_email_lower:
+                    continue
+                # 해당 주문의 line_items에서 원본_주문번호 메타데이터 확인
+                if any(meta.get('key') == '원본_주문번호' and str(meta.get('value')) == original_id
+                       for item in order.get('line_items', [])
+                       for meta in item.get('meta_data', [])):
+                    logger.warning(f"⚠️ 이미 생성된 친구 주문 발견: {order['id']}")
+                    return order['id']
             
             return None
         else:
-            print(f"❌ 주문 검색 실패: {response.status_code}")
+            logger.error(f"❌ 주문 검색 실패: {response.status_code}")
             return None
     except Exception as e:
-        print(f"❌ 중복 확인 오류: {e}")
+        logger.error(f"❌ 중복 확인 오류: {e}")
         return None
 
 
 def get_original_customer_info(order_id):
     """원본 주문의 고객 정보 가져오기"""
+    session = get_http_session()
     
-    base_url = os.getenv('WP_BASE_URL')
-    consumer_key = os.getenv('WP_WOO_CONSUMER_KEY')
-    consumer_secret = os.getenv('WP_WOO_CONSUMER_SECRET')
+    base_url, consumer_key, consumer_secret = _WOO_CFG
     
     order_url = f'{base_url}/wp-json/wc/v3/orders/{order_id}'
     params = {
@@ -261,46 +305,39 @@ def get_original_customer_info(order_id):
     }
     
     try:
-        response = requests.get(order_url, params=params, timeout=10)
+        response = session.get(order_url, params=params, timeout=10)
         if response.status_code == 200:
-            order = response.json()
+            order = load_response_json(response)
             return {
                 'customer_id': order.get('customer_id', 0),
                 'billing': order.get('billing', {}),
                 'shipping': order.get('shipping', {})
             }
         else:
-            print(f'❌ 원본 주문 조회 실패: {response.status_code}')
+            logger.error(f'❌ 원본 주문 조회 실패: {response.status_code}')
             return None
     except Exception as e:
-        print(f'❌ 원본 주문 조회 오류: {e}')
+        logger.error(f'❌ 원본 주문 조회 오류: {e}')
         return None
 
 def create_new_order_for_friend(friend_email, product_name, original_order_id, original_customer_info):
     """친구를 위한 새 주문 생성 (조건별 상태 설정)"""
+    session = get_http_session()
     
     # 미니학습지 환경변수
-    base_url = os.getenv('WP_BASE_URL')
-    consumer_key = os.getenv('WP_WOO_CONSUMER_KEY')
-    consumer_secret = os.getenv('WP_WOO_CONSUMER_SECRET')
-    happy_together_product_id = os.getenv('HAPPY_TOGETHER_PRODUCT_ID')
+    base_url, consumer_key, consumer_secret = _WOO_CFG
+    happy_together_product_id = HAPPY_TOGETHER_PRODUCT_ID
     
     if not all([base_url, consumer_key, consumer_secret, happy_together_product_id]):
-        print("❌ 해피투게더 환경변수가 설정되지 않았습니다")
-        print("   필요한 환경변수: WP_BASE_URL, WP_WOO_CONSUMER_KEY, WP_WOO_CONSUMER_SECRET, HAPPY_TOGETHER_PRODUCT_ID")
+        logger.error("❌ 해피투게더 환경변수가 설정되지 않았습니다")
+        logger.info("   필요한 환경변수: WP_BASE_URL, WP_WOO_CONSUMER_KEY, WP_WOO_CONSUMER_SECRET, HAPPY_TOGETHER_PRODUCT_ID")
         return False
     
     # 주문 생성 시나리오 결정 (안정적 플로우 사용)
     if friend_email:
-        # 1단계: WP Users로 user_id 확보
-        wp_user_id = get_wp_user_id_by_email(friend_email)
-        
-        # 2단계: WooCommerce 고객 초기화/확인 (Customers API 이메일 검색 우회)
-        customer_id = None
-        if wp_user_id:
-            customer_id = ensure_wc_customer_by_user_id(
-                wp_user_id, friend_email, first_name=friend_email.split("@")[0]
-            )
+        # WP Users로 user_id 확보 → WooCommerce 고객 초기화/확인 (이메일별 캐시)
+        customer = find_user_by_stable_flow(friend_email)
+        customer_id = customer["id"] if customer else None
         
         if customer_id:
             # ✅ 회원 주문
@@ -310,7 +347,7 @@ def create_new_order_for_friend(friend_email, product_name, original_order_id, o
                 "email": friend_email,
                 "phone": ""
             }
-            print(f"📋 기존 사용자 ID {customer_id}로 회원 주문 생성")
+            logger.info(f"📋 기존 사용자 ID {customer_id}로 회원 주문 생성")
         else:
             # 게스트로 폴백
             customer_id = 0
@@ -320,12 +357,12 @@ def create_new_order_for_friend(friend_email, product_name, original_order_id, o
                 "email": friend_email,
                 "phone": ""
             }
-            print("📋 신규 사용자로 게스트 주문 생성")
+            logger.info("📋 신규 사용자로 게스트 주문 생성")
     else:
         # 원 주문자로 주문 생성
         customer_id = original_customer_info.get('customer_id', 0)
         billing_info = original_customer_info.get('billing', {})
-        print(f"📋 원 주문자로 주문 생성")
+        logger.info(f"📋 원 주문자로 주문 생성")
     
     # 새 주문 데이터 (상태는 기본값으로 생성 후 순차 업데이트)
     new_order_data = {
@@ -366,42 +403,46 @@ def create_new_order_for_friend(friend_email, product_name, original_order_id, o
     # API 호출
     orders_url = f"{base_url}/wp-json/wc/v3/orders"
     
+    # 주문 본문 직렬화 (orjson 우선)
+    body = dumps_json(new_order_data)
+    headers = {'Content-Type': 'application/json'}
+    
     try:
         if base_url.startswith('https://'):
             params = {
                 'consumer_key': consumer_key,
                 'consumer_secret': consumer_secret
             }
-            response = requests.post(orders_url, json=new_order_data, params=params, timeout=15)
+            response = session.post(orders_url, data=body, headers=headers, params=params, timeout=15)
         else:
             auth = (consumer_key, consumer_secret)
-            response = requests.post(orders_url, json=new_order_data, auth=auth, timeout=15)
+            response = session.post(orders_url, data=body, headers=headers, auth=auth, timeout=15)
         
         if response.status_code == 201:
-            new_order = response.json()
+            new_order = load_response_json(response)
             new_order_id = new_order['id']
-            print(f"✅ 친구 주문 생성 성공!")
-            print(f"📦 새 주문번호: {new_order_id}")
-            print(f"📧 친구 이메일: {friend_email}")
-            print(f"🎁 상품명: {product_name}")
+            logger.info(f"✅ 친구 주문 생성 성공!")
+            logger.info(f"📦 새 주문번호: {new_order_id}")
+            logger.info(f"📧 친구 이메일: {friend_email}")
+            logger.info(f"🎁 상품명: {product_name}")
             
             # 주문 상태 순차 업데이트: 진행중 → 완료됨 → 배송완료
-            print(f"🔄 주문 상태 순차 업데이트 시작...")
+            logger.info(f"🔄 주문 상태 순차 업데이트 시작...")
             update_order_status_sequentially(new_order_id, base_url, consumer_key, consumer_secret)
             
             return new_order_id
         else:
-            print(f"❌ 친구 주문 생성 실패: {response.status_code}")
-            print(f"❌ 응답: {response.text}")
+            logger.error(f"❌ 친구 주문 생성 실패: {response.status_code}")
+            logger.error(f"❌ 응답: {response.text}")
             return False
             
     except Exception as e:
-        print(f"❌ 친구 주문 생성 오류: {e}")
+        logger.error(f"❌ 친구 주문 생성 오류: {e}")
         return False
 
 def update_order_status_sequentially(order_id, base_url, consumer_key, consumer_secret):
     """주문 상태를 순차적으로 업데이트: 진행중 → 완료됨 → 배송완료"""
-    import time
+    session = get_http_session()
     
     # 상태 업데이트 순서
     status_sequence = [
@@ -420,29 +461,28 @@ def update_order_status_sequentially(order_id, base_url, consumer_key, consumer_
                     'consumer_key': consumer_key,
                     'consumer_secret': consumer_secret
                 }
-                response = requests.put(order_url, json=update_data, params=params, timeout=10)
+                response = session.put(order_url, json=update_data, params=params, timeout=10)
             else:
                 auth = (consumer_key, consumer_secret)
-                response = requests.put(order_url, json=update_data, auth=auth, timeout=10)
+                response = session.put(order_url, json=update_data, auth=auth, timeout=10)
             
             if response.status_code == 200:
-                print(f"✅ 주문 상태 업데이트: {status_name}")
+                logger.info(f"✅ 주문 상태 업데이트: {status_name}")
                 time.sleep(1)  # 1초 대기 후 다음 상태로
             else:
-                print(f"⚠️ 상태 업데이트 실패 ({status_name}): {response.status_code}")
-                print(f"   응답: {response.text[:100]}")
+                logger.warning(f"⚠️ 상태 업데이트 실패 ({status_name}): {response.status_code}")
+                logger.warning(f"   응답: {response.text[:100]}")
                 
         except Exception as e:
-            print(f"❌ 상태 업데이트 오류 ({status_name}): {e}")
+            logger.error(f"❌ 상태 업데이트 오류 ({status_name}): {e}")
     
-    print(f"🎉 주문 상태 순차 업데이트 완료!")
+    logger.info(f"🎉 주문 상태 순차 업데이트 완료!")
 
 def get_order_details_with_options(order_id):
     """주문 상세 정보 및 옵션 조회"""
+    session = get_http_session()
     
-    base_url = os.getenv('WP_BASE_URL')
-    consumer_key = os.getenv('WP_WOO_CONSUMER_KEY')
-    consumer_secret = os.getenv('WP_WOO_CONSUMER_SECRET')
+    base_url, consumer_key, consumer_secret = _WOO_CFG
     
     order_url = f'{base_url}/wp-json/wc/v3/orders/{order_id}'
     params = {
@@ -451,44 +491,43 @@ def get_order_details_with_options(order_id):
     }
     
     try:
-        response = requests.get(order_url, params=params, timeout=10)
+        response = session.get(order_url, params=params, timeout=10)
         if response.status_code == 200:
-            return response.json()
+            return load_response_json(response)
         else:
-            print(f'❌ 주문 상세 조회 실패: {response.status_code}')
+            logger.error(f'❌ 주문 상세 조회 실패: {response.status_code}')
             return None
     except Exception as e:
-        print(f'❌ 주문 상세 조회 오류: {e}')
+        logger.error(f'❌ 주문 상세 조회 오류: {e}')
         return None
 
 def process_single_order(order_id):
     """단일 주문에 대한 해피투게더 처리"""
     
-    print(f"🔍 주문 {order_id} 해피투게더 처리 시작")
+    logger.info(f"🔍 주문 {order_id} 해피투게더 처리 시작")
     
     # 주문 상세 정보 조회
     order_details = get_order_details_with_options(order_id)
     
     if not order_details:
-        print(f"❌ 주문 {order_id}을 찾을 수 없습니다")
+        logger.error(f"❌ 주문 {order_id}을 찾을 수 없습니다")
         return False
     
-    print(f"✅ 주문 조회 성공")
-    print(f"📧 고객 이메일: {order_details['billing']['email']}")
-    print(f"📝 고객 노트: {order_details.get('customer_note', 'N/A')}")
+    logger.info(f"✅ 주문 조회 성공")
+    logger.debug(f"📧 고객 이메일: {order_details['billing']['email']}")
+    logger.debug(f"📝 고객 노트: {order_details.get('customer_note', 'N/A')}")
     
     # 스타터팩 상품 찾기
-    starter_pack_item = None
-    for item in order_details.get('line_items', []):
-        if "스타터팩" in item.get('name', ''):
-            starter_pack_item = item
-            break
+    starter_pack_item = next(
+        (item for item in order_details.get('line_items', ()) if STARTER_PACK_KEYWORD in item.get('name', '')),
+        None
+    )
     
     if not starter_pack_item:
-        print("📭 스타터팩 상품이 아님 - 해피투게더 대상 아님")
+        logger.info("📭 스타터팩 상품이 아님 - 해피투게더 대상 아님")
         return False
     
-    print(f"✅ 스타터팩 상품 발견: {starter_pack_item['name']}")
+    logger.info(f"✅ 스타터팩 상품 발견: {starter_pack_item['name']}")
     
     # 고객 메모에서 친구 이메일 추출
     customer_note = order_details.get('customer_note', '')
@@ -498,7 +537,7 @@ def process_single_order(order_id):
     if friend_email:
         existing_order = check_if_friend_order_exists(order_id, friend_email)
         if existing_order:
-            print(f"⚠️ 이미 처리된 주문입니다: 기존 친구 주문 {existing_order}")
+            logger.warning(f"⚠️ 이미 처리된 주문입니다: 기존 친구 주문 {existing_order}")
             return False
     
     # 상품 옵션 분석
@@ -506,17 +545,17 @@ def process_single_order(order_id):
     second_language = options.get('second_language', '')
     paper_type = options.get('paper_type', '')
     
-    print(f"📋 상품 옵션:")
-    print(f"  - 두 번째 언어: {second_language}")
-    print(f"  - 학습지 유형: {paper_type}")
+    logger.debug(f"📋 상품 옵션:")
+    logger.debug(f"  - 두 번째 언어: {second_language}")
+    logger.debug(f"  - 학습지 유형: {paper_type}")
     
     if not second_language:
-        print("❌ 두 번째 언어 옵션을 찾을 수 없습니다")
+        logger.error("❌ 두 번째 언어 옵션을 찾을 수 없습니다")
         return False
     
     # 새 상품명 결정
     new_product_name = determine_product_variation(second_language, paper_type)
-    print(f"🎁 생성할 상품명: {new_product_name}")
+    logger.info(f"🎁 생성할 상품명: {new_product_name}")
     
     # 원본 주문 고객 정보
     original_customer_info = {
@@ -526,7 +565,7 @@ def process_single_order(order_id):
     }
     
     # 친구 주문 생성
-    print(f"\n🚀 친구 주문 생성 시작...")
+    logger.info(f"\n🚀 친구 주문 생성 시작...")
     new_order_id = create_new_order_for_friend(
         friend_email,
         new_product_name,
@@ -535,17 +574,43 @@ def process_single_order(order_id):
     )
     
     if new_order_id:
-        print(f"\n🎉 성공!")
-        print(f"📦 원본 주문: {order_id}")
-        print(f"📦 새 주문: {new_order_id}")
-        print(f"📧 친구 이메일: {friend_email if friend_email else '원 주문자'}")
-        print(f"🎁 상품명: {new_product_name}")
+        logger.info(f"\n🎉 성공!")
+        logger.info(f"📦 원본 주문: {order_id}")
+        logger.info(f"📦 새 주문: {new_order_id}")
+        logger.info(f"📧 친구 이메일: {friend_email if friend_email else '원 주문자'}")
+        logger.info(f"🎁 상품명: {new_product_name}")
         return True
     else:
-        print(f"\n❌ 친구 주문 생성 실패")
+        logger.error(f"\n❌ 친구 주문 생성 실패")
         return False
 
 
+# 해피투게더 주문 동시 처리 수 (WP REST 요청 부하 고려)
+HAPPY_TOGETHER_WORKERS = 4
+
+def process_orders(order_ids):
+    """여러 주문 해피투게더 병렬 처리 (주문별 REST 호출이 네트워크 대기 위주, 성공 건수 반환)"""
+    def _process(order_id):
+        logger.info(f"\n🎯 주문 {order_id} 해피투게더 처리 중...")
+        try:
+            success = process_single_order(order_id)
+        except Exception as e:
+            logger.error(f"❌ 주문 {order_id} 해피투게더 처리 오류: {e}")
+            return False
+        
+        if success:
+            logger.info(f"✅ 주문 {order_id} 해피투게더 처리 완료")
+        else:
+            logger.warning(f"⚠️ 주문 {order_id} 해피투게더 처리 실패 또는 조건 불만족")
+        return bool(success)
+    
+    if not order_ids:
+        return 0
+    
+    with ThreadPoolExecutor(max_workers=min(HAPPY_TOGETHER_WORKERS, len(order_ids))) as executor:
+        return sum(executor.map(_process, order_ids))
+
+
 if __name__ == "__main__":
     import sys
     
@@ -3,15 +3,18 @@
 3PL 주문 처리 시스템 - 메인 실행 파일
 """
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from common_utils import (
     get_date_range, 
     get_woocommerce_auth, 
     fetch_orders_from_wp, 
     convert_orders_to_dataframe,
+    get_product_name_mapping,
     should_skip_today,
     processing_results,
-    filter_po_box_orders
+    filter_po_box_orders,
+    flush_ems_orders
 )
 from mini_domestic import process_mini_domestic_orders
 from mini_international import process_mini_international_orders
@@ -20,7 +23,7 @@ from dok_domestic import process_dok_domestic_orders
 from dok_international import process_dok_international_orders
 from dok_status import process_dok_reservation_status_change, process_dok_digital_status_change, process_dok_b2b_status_change
 from email_sender import collect_shipping_files, send_shipping_files_email, send_processing_result_email, backup_files_to_drive
-from happy_together_processor import process_single_order
+from happy_together_processor import process_orders, STARTER_PACK_KEYWORD
 
 # .env 파일 로드
 load_dotenv()
@@ -58,63 +61,43 @@ def process_happy_together_for_site(site_name, base_url, consumer_key, consumer_
     
     print(f"📊 {site_name} completed 주문 {len(orders)}개 조회")
     
-    # 각 주문에 대해 해피투게더 처리
-    processed_count = 0
-    for order in orders:
-        order_id = order.get('id')
-        
-        # 스타터팩 상품이 있는지 확인
-        has_starter_pack = False
-        for item in order.get('line_items', []):
-            if "스타터팩" in item.get('name', ''):
-                has_starter_pack = True
-                break
-        
-        if has_starter_pack:
-            print(f"\n🎯 주문 {order_id} 해피투게더 처리 중...")
-            try:
-                success = process_single_order(order_id)
-                if success:
-                    processed_count += 1
-                    print(f"✅ 주문 {order_id} 해피투게더 처리 완료")
-                else:
-                    print(f"⚠️ 주문 {order_id} 해피투게더 처리 실패 또는 조건 불만족")
-            except Exception as e:
-                print(f"❌ 주문 {order_id} 해피투게더 처리 오류: {e}")
+    # 스타터팩 상품이 있는 주문만 해피투게더 처리 (주문별 병렬 처리)
+    starter_pack_order_ids = [
+        order.get('id') for order in orders
+        if any(STARTER_PACK_KEYWORD in item.get('name', '') for item in order.get('line_items', ()))
+    ]
+    processed_count = process_orders(starter_pack_order_ids)
     
     print(f"\n🎁 {site_name} 해피투게더 처리 완료: {processed_count}개 주문 처리")
     
     # 결과 수집
     processing_results.add_happy_together(processed_count)
 
-def process_site_orders(site_name, base_url, consumer_key, consumer_secret, start_date, end_date):
-    """사이트별 주문 처리"""
-    print(f"\n=== {site_name} 처리 시작 ===")
-    
+def fetch_site_orders(site_name, base_url, consumer_key, consumer_secret, start_date, end_date):
+    """사이트별 주문 데이터 수집 (인증 + 조회, 실패 시 None)"""
     # 인증 설정
     auth = get_woocommerce_auth(base_url, consumer_key, consumer_secret)
     if not auth:
         print(f"❌ {site_name} 인증 실패")
         return None
     
-    # 주문 데이터 수집
-    orders = fetch_orders_from_wp(base_url, auth, start_date, end_date)
+    # 완료된 주문만 API에서 조회 (이후 DataFrame 단계의 상태 필터 불필요)
+    return fetch_orders_from_wp(base_url, auth, start_date, end_date, status='completed')
+
+def process_site_orders(site_name, orders, product_mapping=None):
+    """사이트별 주문 처리 (미리 수집한 주문 데이터 사용)"""
+    print(f"\n=== {site_name} 처리 시작 ===")
+    
     if not orders:
         print(f"❌ {site_name} 주문 데이터 없음")
         return None
     
     # DataFrame 변환
-    df = convert_orders_to_dataframe(orders, site_name)
+    df = convert_orders_to_dataframe(orders, site_name, product_mapping)
     if df.empty:
         print(f"❌ {site_name} 변환된 주문 데이터 없음")
         return None
     
-    # 완료된 주문만 필터링
-    df = df[df["주문상태"] == "완료됨"].copy()
-    if df.empty:
-        print(f"✅ {site_name}: 완료된 주문 없음")
-        return None
-    
     # 사서함 주문 분리
     print(f"📮 {site_name} 사서함 주문 분리 중...")
     df, po_box_file_path = filter_po_box_orders(df)
@@ -126,8 +109,8 @@ def process_site_orders(site_name, base_url, consumer_key, consumer_secret, star
         # 1. 미니학습지 예약 상품 상태 변경 (주문서 작성 전)
         process_mini_reservation_status_change(df)
         
-        # 예약 상품 제외한 DataFrame 생성 (전체 SKU 문자열에서 확인)
-        shipping_df = df[~df["SKU"].str.contains("\\[예약상품\\]", na=False)].copy()
+        # 예약 상품 제외한 DataFrame 생성 (전체 SKU 문자열에서 확인, 하위 처리에서 각자 복사하므로 복사 생략)
+        shipping_df = df[~df["SKU"].str.contains("[예약상품]", regex=False, na=False)]
         
         # 2. 미니학습지 국내 주문서 (예약 제외)
         process_mini_domestic_orders(shipping_df)
@@ -145,8 +128,8 @@ def process_site_orders(site_name, base_url, consumer_key, consumer_secret, star
         # 6. 독독독 예약 상품 상태 변경 (주문서 작성 전)
         process_dok_reservation_status_change(df)
         
-        # 예약 상품 제외한 DataFrame 생성 (전체 SKU 문자열에서 확인)
-        shipping_df = df[~df["SKU"].str.contains("\\[예약상품\\]", na=False)].copy()
+        # 예약 상품 제외한 DataFrame 생성 (전체 SKU 문자열에서 확인, 하위 처리에서 각자 복사하므로 복사 생략)
+        shipping_df = df[~df["SKU"].str.contains("[예약상품]", regex=False, na=False)]
         
         # 7. 독독독 국내 주문서 (예약 제외)
         process_dok_domestic_orders(shipping_df)
@@ -193,31 +176,53 @@ def main():
     print("🎁 1단계: 해피투게더 처리 (completed 주문만)")
     print("="*60)
     
-    if MINI_WP_BASE_URL and MINI_WP_CONSUMER_KEY and MINI_WP_CONSUMER_SECRET:
-        process_happy_together_for_site("미니학습지", MINI_WP_BASE_URL, MINI_WP_CONSUMER_KEY, MINI_WP_CONSUMER_SECRET, start_date, end_date)
-    else:
-        print("❌ 미니학습지 환경변수 설정이 불완전합니다 - 해피투게더 건너뜀")
-    
-    # 📦 2단계: 일반 주문 처리
-    print("\n" + "="*60)
-    print("📦 2단계: 일반 주문 처리 (국내/국외/상태변경)")
-    print("="*60)
-    
-    # 독독독 사이트 처리
-    if DOK_WP_BASE_URL and DOK_WP_CONSUMER_KEY and DOK_WP_CONSUMER_SECRET:
-        dok_po_box_file = process_site_orders("독독독", DOK_WP_BASE_URL, DOK_WP_CONSUMER_KEY, DOK_WP_CONSUMER_SECRET, start_date, end_date)
-        if dok_po_box_file:
-            po_box_file_paths.append(dok_po_box_file)
-    else:
-        print("❌ 독독독 사이트 환경변수 설정이 불완전합니다")
+    mini_available = bool(MINI_WP_BASE_URL and MINI_WP_CONSUMER_KEY and MINI_WP_CONSUMER_SECRET)
+    dok_available = bool(DOK_WP_BASE_URL and DOK_WP_CONSUMER_KEY and DOK_WP_CONSUMER_SECRET)
+    
+    # 해피투게더와 무관한 조회(독독독 주문, 상품명 매핑)는 백그라운드에서 미리 수행
+    # (미니학습지 주문은 해피투게더로 생성된 주문을 포함해야 하므로 해피투게더 이후 조회)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        dok_future = None
+        if dok_available:
+            dok_future = executor.submit(fetch_site_orders, "독독독", DOK_WP_BASE_URL, DOK_WP_CONSUMER_KEY, DOK_WP_CONSUMER_SECRET, start_date, end_date)
+        # 상품명 매핑은 두 사이트가 공통으로 사용하므로 한 번만 조회
+        mapping_future = executor.submit(get_product_name_mapping)
+        
+        if mini_available:
+            process_happy_together_for_site("미니학습지", MINI_WP_BASE_URL, MINI_WP_CONSUMER_KEY, MINI_WP_CONSUMER_SECRET, start_date, end_date)
+        else:
+            print("❌ 미니학습지 환경변수 설정이 불완전합니다 - 해피투게더 건너뜀")
+        
+        # 미니학습지 주문 조회는 독독독 처리와 겹쳐서 수행
+        mini_future = None
+        if mini_available:
+            mini_future = executor.submit(fetch_site_orders, "미니학습지", MINI_WP_BASE_URL, MINI_WP_CONSUMER_KEY, MINI_WP_CONSUMER_SECRET, start_date, end_date)
+        
+        # 📦 2단계: 일반 주문 처리
+        print("\n" + "="*60)
+        print("📦 2단계: 일반 주문 처리 (국내/국외/상태변경)")
+        print("="*60)
+        
+        product_mapping = mapping_future.result()
+        
+        # 독독독 사이트 처리
+        if dok_future is not None:
+            dok_po_box_file = process_site_orders("독독독", dok_future.result(), product_mapping)
+            if dok_po_box_file:
+                po_box_file_paths.append(dok_po_box_file)
+        else:
+            print("❌ 독독독 사이트 환경변수 설정이 불완전합니다")
+        
+        # 미니학습지 사이트 처리
+        if mini_future is not None:
+            mini_po_box_file = process_site_orders("미니학습지", mini_future.result(), product_mapping)
+            if mini_po_box_file:
+                po_box_file_paths.append(mini_po_box_file)
+        else:
+            print("❌ 미니학습지 사이트 환경변수 설정이 불완전합니다")
     
-    # 미니학습지 사이트 처리
-    if MINI_WP_BASE_URL and MINI_WP_CONSUMER_KEY and MINI_WP_CONSUMER_SECRET:
-        mini_po_box_file = process_site_orders("미니학습지", MINI_WP_BASE_URL, MINI_WP_CONSUMER_KEY, MINI_WP_CONSUMER_SECRET, start_date, end_date)
-        if mini_po_box_file:
-            po_box_file_paths.append(mini_po_box_file)
-    else:
-        print("❌ 미니학습지 사이트 환경변수 설정이 불완전합니다")
+    # 두 사이트의 EMS 주문을 한 번에 저장
+    flush_ems_orders()
     
     print("\n=== 3PL 주문 처리 시스템 완료 ===")
     
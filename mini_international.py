@@ -3,12 +3,14 @@
 미니학습지 국외(EMS) 주문서 작성 모듈
 """
 import pandas as pd
-from datetime import datetime
-import requests
 import re
-import time
 import os
-from common_utils import DOWNLOAD_DIR, is_korean_address, apply_string_format, is_pure_digital_product, processing_results, filter_korean_recipients, filter_non_english_addresses
+import time
+from concurrent.futures import ThreadPoolExecutor
+from common_utils import get_http_session, korean_address_mask, overseas_address_mask, queue_ems_orders, get_ems_path, processing_results, filter_ems_excluded, logger
+
+# Google Maps 지오코딩 동시 요청 수
+GEOCODE_WORKERS = 8
 
 def normalize_address_with_google_maps(address, api_key):
     """Google Maps API를 사용한 주소 정규화 및 국가코드 추출"""
@@ -25,7 +27,7 @@ def normalize_address_with_google_maps(address, api_key):
             'language': 'en'
         }
         
-        response = requests.get(geocoding_url, params=params, timeout=10)
+        response = get_http_session().get(geocoding_url, params=params, timeout=10)
         
         if response.status_code == 200:
             data = response.json()
@@ -44,26 +46,26 @@ def normalize_address_with_google_maps(address, api_key):
                     return cleaned_address, country_code
                 else:
                     reconstructed_address = reconstruct_address_from_components(components, cleaned_address)
-                    print(f"🌍 주소 정규화: {cleaned_address}")
-                    print(f"🌍 재구성 결과: {reconstructed_address}")
-                    print(f"🌍 국가코드 추출: {country_code}")
+                    logger.debug(f"🌍 주소 정규화: {cleaned_address}")
+                    logger.debug(f"🌍 재구성 결과: {reconstructed_address}")
+                    logger.debug(f"🌍 국가코드 추출: {country_code}")
                     
                     # 원본과 재구성된 주소가 다른 경우 상세 로그
                     if cleaned_address != reconstructed_address:
-                        print(f"📝 주소 변경 감지 - 원본 정보 보존 확인")
+                        logger.debug(f"📝 주소 변경 감지 - 원본 정보 보존 확인")
                     
                     return reconstructed_address, country_code
             
             else:
-                print(f"⚠️ Google Maps에서 주소를 찾을 수 없음: {cleaned_address}")
+                logger.warning(f"⚠️ Google Maps에서 주소를 찾을 수 없음: {cleaned_address}")
                 return cleaned_address, None
         
         else:
-            print(f"⚠️ Google Maps API 호출 실패: {response.status_code}")
+            logger.warning(f"⚠️ Google Maps API 호출 실패: {response.status_code}")
             return cleaned_address, None
     
     except Exception as e:
-        print(f"⚠️ 주소 정규화 오류: {e}")
+        logger.warning(f"⚠️ 주소 정규화 오류: {e}")
         return cleaned_address, None
 
 def reconstruct_address_from_components(components, original_address):
@@ -108,6 +110,14 @@ def reconstruct_address_from_components(components, original_address):
         if street_number:
             google_street_address += f" {street_number}"
     
+    # 비교용 소문자 문자열과 키워드(4자 이상 단어)는 부분마다 다시 만들지 않도록 미리 계산
+    street_lower = google_street_address.lower()
+    street_words = [word for word in street_lower.split() if len(word) > 3]
+    route_lower = route.lower()
+    route_words = [word for word in route_lower.split() if len(word) > 3]
+    locality_lower = locality.lower()
+    country_lower = country.lower()
+    
     # 원본 주소에서 각 부분을 분석하여 보존할지 결정
     for part in original_parts:
         part_lower = part.lower()
@@ -115,41 +125,41 @@ def reconstruct_address_from_components(components, original_address):
         
         # Google Maps에서 인식된 부분인지 확인 (더 정확한 매칭)
         if google_street_address and (
-            google_street_address.lower() in part_lower or 
-            part_lower in google_street_address.lower() or
-            any(word in part_lower for word in google_street_address.lower().split() if len(word) > 3)
+            street_lower in part_lower or 
+            part_lower in street_lower or
+            any(word in part_lower for word in street_words)
         ):
             used_parts.add(part)
             should_preserve = False  # Google Maps 버전을 사용
-            print(f"  📍 Google Maps 거리 주소로 대체: '{part}' → '{google_street_address}'")
+            logger.debug(f"  📍 Google Maps 거리 주소로 대체: '{part}' → '{google_street_address}'")
         elif route and (
-            route.lower() in part_lower or 
-            part_lower in route.lower() or
-            any(word in part_lower for word in route.lower().split() if len(word) > 3)
+            route_lower in part_lower or 
+            part_lower in route_lower or
+            any(word in part_lower for word in route_words)
         ):
             used_parts.add(part)
             should_preserve = False  # Google Maps 버전을 사용
-            print(f"  📍 Google Maps 도로명으로 대체: '{part}' → '{route}'")
-        elif locality and locality.lower() in part_lower:
+            logger.debug(f"  📍 Google Maps 도로명으로 대체: '{part}' → '{route}'")
+        elif locality and locality_lower in part_lower:
             used_parts.add(part)
             should_preserve = False  # Google Maps 버전을 사용
-            print(f"  📍 Google Maps 도시명으로 대체: '{part}' → '{locality}'")
-        elif country and country.lower() in part_lower:
+            logger.debug(f"  📍 Google Maps 도시명으로 대체: '{part}' → '{locality}'")
+        elif country and country_lower in part_lower:
             used_parts.add(part)
             should_preserve = False  # Google Maps 버전을 사용
-            print(f"  📍 Google Maps 국가명으로 대체: '{part}' → '{country}'")
+            logger.debug(f"  📍 Google Maps 국가명으로 대체: '{part}' → '{country}'")
         elif postal_code and postal_code in part:
             used_parts.add(part)
             should_preserve = False  # Google Maps 버전을 사용
-            print(f"  📍 Google Maps 우편번호로 대체: '{part}' → '{postal_code}'")
+            logger.debug(f"  📍 Google Maps 우편번호로 대체: '{part}' → '{postal_code}'")
         
         # Google Maps에서 인식하지 못한 부분은 보존
         if should_preserve and part.strip():
             preserved_parts.append(part.strip())
-            print(f"  ✅ 원본 정보 보존: '{part.strip()}'")
+            logger.debug(f"  ✅ 원본 정보 보존: '{part.strip()}'")
     
-    print(f"  🔍 보존된 원본 정보: {preserved_parts}")
-    print(f"  🔍 Google Maps 정규화: 거리='{google_street_address}', 도시='{locality}', 국가='{country}'")
+    logger.debug(f"  🔍 보존된 원본 정보: {preserved_parts}")
+    logger.debug(f"  🔍 Google Maps 정규화: 거리='{google_street_address}', 도시='{locality}', 국가='{country}'")
     
     # 주소 재구성 - 원본 정보를 먼저 배치
     address_parts = []
@@ -185,32 +195,38 @@ def reconstruct_address_from_components(components, original_address):
 def process_overseas_addresses(df, api_key):
     """해외 배송 주소들을 Google Maps로 정규화 및 국가코드 추출"""
     if not api_key:
-        print("⚠️ Google Maps API 키가 설정되지 않아 주소 정규화를 건너뜁니다.")
+        logger.warning("⚠️ Google Maps API 키가 설정되지 않아 주소 정규화를 건너뜁니다.")
         return df
     
-    print("🌍 해외 배송 주소 정규화 시작...")
+    logger.info("🌍 해외 배송 주소 정규화 시작...")
     
-    overseas_mask = ~df["배송지주소"].apply(is_korean_address)
-    overseas_df = df[overseas_mask].copy()
+    overseas_mask = ~korean_address_mask(df["배송지주소"])
+    addresses = df.loc[overseas_mask, "배송지주소"]
     
-    if overseas_df.empty:
-        print("✅ 해외 배송 주소 없음")
+    if addresses.empty:
+        logger.info("✅ 해외 배송 주소 없음")
         return df
     
-    print(f"🌍 {len(overseas_df)}개의 해외 주소 정규화 중...")
+    logger.info(f"🌍 {len(addresses)}개의 해외 주소 정규화 중...")
     
-    for idx, row in overseas_df.iterrows():
-        original_address = row["배송지주소"]
-        normalized_address, country_code = normalize_address_with_google_maps(original_address, api_key)
-        
-        df.at[idx, "배송지주소"] = normalized_address
-        
-        if country_code:
-            df.at[idx, "국가코드"] = country_code
-        
-        time.sleep(0.1)
+    # 같은 주소는 1회만 조회하고, 조회는 네트워크 대기 위주이므로 스레드로 병렬 처리
+    started = time.perf_counter()
+    unique_addresses = list(dict.fromkeys(addresses))
+    workers = min(GEOCODE_WORKERS, len(unique_addresses))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = dict(zip(
+            unique_addresses,
+            executor.map(lambda address: normalize_address_with_google_maps(address, api_key), unique_addresses)
+        ))
     
-    print("✅ 해외 배송 주소 정규화 완료")
+    df.loc[addresses.index, "배송지주소"] = [results[address][0] for address in addresses]
+    
+    country_codes = pd.Series([results[address][1] for address in addresses], index=addresses.index)
+    country_codes = country_codes[country_codes.notna() & (country_codes != "")]
+    if not country_codes.empty:
+        df.loc[country_codes.index, "국가코드"] = country_codes
+    
+    logger.info(f"✅ 해외 배송 주소 정규화 완료: {len(unique_addresses)}개 주소, {time.perf_counter() - started:.2f}초")
     return df
 
 def process_mini_international_orders(df):
@@ -222,111 +238,71 @@ def process_mini_international_orders(df):
     
     print("--- 미니학습지 국외(EMS) 주문서 작성 시작 ---")
     
-    # 해외 주소만 필터링 (주소가 있고 한국어가 아닌 경우)
-    overseas = df[
-        df["배송지주소"].notna() & 
-        (df["배송지주소"].str.strip() != "") &
-        (~df["배송지주소"].apply(is_korean_address))
-    ].copy()
-    
-    # 추가 한국 주소 제외 (국가코드 KR 확인)
-    if not overseas.empty:
-        print(f"🔍 해외 주소 후보: {len(overseas)}개")
-        
-        # 각 주소를 다시 한 번 확인
-        truly_overseas = []
-        for idx, row in overseas.iterrows():
-            addr = str(row["배송지주소"])
-            
-            # KR이 포함되어 있으면 한국 주소로 간주
-            if not is_korean_address(addr):
-                truly_overseas.append(idx)
-            else:
-                print(f"⚠️ 한국 주소로 재분류: {addr[:50]}...")
-        
-        overseas = overseas.loc[truly_overseas].copy()
-        print(f"🌍 실제 해외 주소: {len(overseas)}개")
+    # 해외 주소만 필터링 (주소가 있고 한국어/국가코드 KR이 아닌 경우, 벡터 연산)
+    overseas = df[overseas_address_mask(df["배송지주소"])]
     
     if overseas.empty:
         print("✅ 미니학습지: 유효한 해외 배송 주소 없음")
         processing_results.add_international_orders(0)
         return
     
+    print(f"🌍 실제 해외 주소: {len(overseas)}개")
+    
     # B2B 상품 및 디지털 상품 제외 (전체 SKU 문자열에서 확인)
     overseas = overseas[
-        (~overseas["SKU"].str.contains("\\[B2B\\]", na=False)) &
-        (~overseas["SKU"].str.contains("\\[디지털\\]", na=False))
-    ].copy()
+        (~overseas["SKU"].str.contains("[B2B]", regex=False, na=False)) &
+        (~overseas["SKU"].str.contains("[디지털]", regex=False, na=False))
+    ]
     
     if overseas.empty:
         print("✅ 미니학습지: 해외 실물 배송 주문 없음 (디지털/B2B 제외)")
         processing_results.add_international_orders(0)
         return
     
-    # 한글 수령인명 필터링 (EMS는 영문 이름만 허용)
-    print("🔍 한글 수령인명 확인 중...")
-    overseas, korean_recipients = filter_korean_recipients(overseas)
+    # 한글 수령인명 / 비영문 주소 필터링 (EMS는 영문 이름과 영문 주소만 허용)
+    print("🔍 한글 수령인명 및 비영문 주소 확인 중...")
+    overseas, korean_recipients, non_english_addresses = filter_ems_excluded(overseas)
     
     # 한글 수령인명 이슈 기록
     if not korean_recipients.empty:
         processing_results.add_korean_recipient_issue(korean_recipients, "미니학습지")
     
-    if overseas.empty:
-        print("✅ 미니학습지: 한글 수령인명 제외 후 유효한 해외 배송 주문 없음")
-        processing_results.add_international_orders(0)
-        return
-    
-    # 비영문 주소 필터링 (일본어, 중국어 등 제외)
-    print("🔍 비영문 주소 확인 중...")
-    overseas, non_english_addresses = filter_non_english_addresses(overseas)
-    
     # 비영문 주소 이슈 기록
     if not non_english_addresses.empty:
         processing_results.add_non_english_address_issue(non_english_addresses, "미니학습지")
     
     if overseas.empty:
-        print("✅ 미니학습지: 비영문 주소 제외 후 유효한 해외 배송 주문 없음")
+        print("✅ 미니학습지: 한글 수령인명/비영문 주소 제외 후 유효한 해외 배송 주문 없음")
         processing_results.add_international_orders(0)
         return
     
-    # 데이터 처리 (쇼핑몰상품코드는 이미 원래 SKU로 설정됨)
-    overseas["수령인연락처1"] = overseas["수령인 연락처"]
-    overseas["수령인연락처2"] = overseas["수령인 이메일"]  # EMS는 연락처2에 이메일 사용
-    overseas["송장번호"] = ""
-    overseas["국가코드"] = ""
-    
-    # 주문번호 접두사 추가
-    overseas["주문번호"] = overseas["주문번호"].apply(lambda x: "S" + str(x))
+    # EMS용 표준 컬럼으로 새 DataFrame을 한 번에 구성 (컬럼을 하나씩 추가하지 않음, 쇼핑몰상품코드는 이미 원래 SKU로 설정됨)
+    # 주문번호 접두사 추가, EMS는 연락처2에 이메일 사용, 배송 메모/송장번호/국가코드는 빈 값
+    overseas_ems = pd.DataFrame({
+        "주문번호": "S" + overseas["주문번호"].astype(str),
+        "상품명": overseas["상품명"],
+        "품번코드": overseas["품번코드"],
+        "쇼핑몰상품코드": overseas["쇼핑몰상품코드"],
+        "수량": overseas["수량"],
+        "수령인명": overseas["수령인명"],
+        "수령인연락처1": overseas["수령인 연락처"],
+        "수령인연락처2": overseas["수령인 이메일"],
+        "우편번호": overseas["우편번호"],
+        "배송지주소": overseas["배송지주소"],
+        "배송메세지": "",
+        "송장번호": "",
+        "국가코드": "",
+    })
     
     # Google Maps 주소 정규화
     google_api_key = os.getenv('GOOGLE_MAPS_API_KEY')
-    overseas = process_overseas_addresses(overseas, google_api_key)
-    
-    # EMS용 표준 컬럼 선택 (배송 메모는 빈 값)
-    overseas["배송메세지"] = ""  # EMS는 배송 메모 비움
-    
-    ems_columns = [
-        "주문번호", "상품명", "품번코드", "쇼핑몰상품코드", "수량",
-        "수령인명", "수령인연락처1", "수령인연락처2", "우편번호",
-        "배송지주소", "배송메세지", "송장번호", "국가코드"
-    ]
-    overseas_ems = overseas[ems_columns].copy()
-    overseas_ems = overseas_ems.sort_values(by="주문번호")
-    
-    # Excel 파일 저장
-    today_str = datetime.today().strftime('%y%m%d')
-    ems_path = f"{DOWNLOAD_DIR}/{today_str} 노이지콘텐츠주문서(EMS).xlsx"
-    
-    # 기존 EMS 파일과 통합
-    if os.path.exists(ems_path):
-        old = pd.read_excel(ems_path)
-        overseas_ems = pd.concat([old, overseas_ems], ignore_index=True)
+    overseas_ems = process_overseas_addresses(overseas_ems, google_api_key).sort_values(by="주문번호")
     
-    overseas_ems.to_excel(ems_path, index=False)
-    apply_string_format(ems_path, ["수량", "수령인연락처1", "수령인연락처2", "우편번호"])
-    print(f"📦 미니학습지 EMS 주문서 저장 완료: {len(overseas_ems)}건 - {ems_path}")
+    # EMS 통합 주문서에 추가 (모든 사이트 처리 후 한 번에 저장)
+    queue_ems_orders(overseas_ems)
+    print(f"📦 미니학습지 EMS 주문 {len(overseas_ems)}건 추가 (통합 주문서 저장 대기)")
     
     # 결과 수집
     processing_results.add_international_orders(len(overseas_ems))
     
-    return ems_path
+    return get_ems_path()
@@ -3,32 +3,42 @@
 미니학습지 주문상태 변경 모듈 (WooCommerce API 직접 변경 + CSV 파일 생성)
 """
 import pandas as pd
+import numpy as np
 import os
-import requests
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from common_utils import DOWNLOAD_DIR, update_orders_batch, processing_results
+from common_utils import DOWNLOAD_DIR, update_orders_batch, update_orders_batch_ids, processing_results, get_http_session, dumps_json, STATUS_UPDATE_WORKERS
 
 load_dotenv()
 
+# 미니학습지 WooCommerce API 설정 (모듈 로드 시 1회 조회)
+_MINI_CFG = (
+    os.getenv('WP_BASE_URL'),
+    os.getenv('WP_WOO_CONSUMER_KEY'),
+    os.getenv('WP_WOO_CONSUMER_SECRET')
+)
+MINI_AVAILABLE = all(_MINI_CFG)
+
 def update_order_status_in_woocommerce(order_id, new_status):
     """WooCommerce API를 통한 주문상태 직접 변경"""
     
-    # 미니학습지 환경변수
-    base_url = os.getenv('WP_BASE_URL')
-    consumer_key = os.getenv('WP_WOO_CONSUMER_KEY')
-    consumer_secret = os.getenv('WP_WOO_CONSUMER_SECRET')
-    
-    if not all([base_url, consumer_key, consumer_secret]):
+    if not MINI_AVAILABLE:
         print("❌ 미니학습지 WooCommerce API 환경변수가 설정되지 않았습니다")
         return False
     
+    base_url, consumer_key, consumer_secret = _MINI_CFG
+    
     order_url = f"{base_url}/wp-json/wc/v3/orders/{order_id}"
     
-    # 주문상태 업데이트 데이터
+    # 주문상태 업데이트 데이터 (orjson 직렬화)
     update_data = {
         "status": new_status
     }
+    body = dumps_json(update_data)
+    headers = {'Content-Type': 'application/json'}
+    
+    session = get_http_session()
     
     try:
         if base_url.startswith('https://'):
@@ -37,11 +47,11 @@ def update_order_status_in_woocommerce(order_id, new_status):
                 'consumer_key': consumer_key,
                 'consumer_secret': consumer_secret
             }
-            response = requests.put(order_url, json=update_data, params=params, timeout=10)
+            response = session.put(order_url, data=body, headers=headers, params=params, timeout=10)
         else:
             # HTTP - Basic Auth
             auth = (consumer_key, consumer_secret)
-            response = requests.put(order_url, json=update_data, auth=auth, timeout=10)
+            response = session.put(order_url, data=body, headers=headers, auth=auth, timeout=10)
         
         if response.status_code == 200:
             updated_order = response.json()
@@ -70,8 +80,8 @@ def process_mini_reservation_status_change(df):
     print("--- 미니학습지 예약 상품 상태 변경 시작 ---")
     
     # 예약 상품만 필터링 (전체 SKU 문자열에서 확인)
-    reservation_mask = df["SKU"].str.contains("\\[예약상품\\]", na=False)
-    reservation_df = df[reservation_mask].copy()
+    reservation_mask = df["SKU"].str.contains("[예약상품]", regex=False, na=False)
+    reservation_df = df[reservation_mask]
     
     if reservation_df.empty:
         print("✅ 미니학습지: 예약 상품 없음")
@@ -81,12 +91,7 @@ def process_mini_reservation_status_change(df):
     # 예약 상품 상태 변경 (배치 처리)
     print("🔄 미니학습지 예약 상품 WooCommerce 상태 변경 중...")
     
-    # 환경변수 가져오기
-    base_url = os.getenv('WP_BASE_URL')
-    consumer_key = os.getenv('WP_WOO_CONSUMER_KEY')
-    consumer_secret = os.getenv('WP_WOO_CONSUMER_SECRET')
-    
-    if not all([base_url, consumer_key, consumer_secret]):
+    if not MINI_AVAILABLE:
         print("❌ 미니학습지 WooCommerce API 환경변수가 설정되지 않았습니다")
         return []
     
@@ -94,7 +99,7 @@ def process_mini_reservation_status_change(df):
     order_ids = reservation_df["주문번호"].tolist()
     
     # 배치 업데이트 실행
-    updated_count = update_orders_batch(order_ids, "processing", base_url, consumer_key, consumer_secret)
+    updated_count = update_orders_batch(order_ids, "processing", *_MINI_CFG)
     
     print(f"✅ 미니학습지 예약 상품 {updated_count}개 주문 상태 변경 완료")
     
@@ -112,8 +117,8 @@ def process_mini_digital_status_change(df):
     print("--- 미니학습지 디지털 상품 (배송완료) 상품 처리 시작 ---")
     
     # 디지털 상품만 필터링 (전체 SKU 문자열에서 확인)
-    digital_mask = df["SKU"].str.contains("\\[디지털\\]", na=False)
-    digital_df = df[digital_mask].copy()
+    digital_mask = df["SKU"].str.contains("[디지털]", regex=False, na=False)
+    digital_df = df[digital_mask]
     
     if digital_df.empty:
         print("✅ 미니학습지: 디지털 상품 없음")
@@ -122,12 +127,7 @@ def process_mini_digital_status_change(df):
     # 디지털 상품 상태 변경 (배치 처리)
     print("🔄 미니학습지 디지털 상품 WooCommerce 상태 변경 중...")
     
-    # 환경변수 가져오기
-    base_url = os.getenv('WP_BASE_URL')
-    consumer_key = os.getenv('WP_WOO_CONSUMER_KEY')
-    consumer_secret = os.getenv('WP_WOO_CONSUMER_SECRET')
-    
-    if not all([base_url, consumer_key, consumer_secret]):
+    if not MINI_AVAILABLE:
         print("❌ 미니학습지 WooCommerce API 환경변수가 설정되지 않았습니다")
         return []
     
@@ -135,7 +135,7 @@ def process_mini_digital_status_change(df):
     order_ids = digital_df["주문번호"].tolist()
     
     # 배치 업데이트 실행
-    updated_count = update_orders_batch(order_ids, "shipped", base_url, consumer_key, consumer_secret)
+    updated_count = update_orders_batch(order_ids, "shipped", *_MINI_CFG)
     
     print(f"✅ 미니학습지 디지털 상품 {updated_count}개 주문 상태 변경 완료")
     
@@ -153,8 +153,8 @@ def process_mini_b2b_status_change(df):
     print("--- 미니학습지 B2B 상품 (배송완료) 상품 처리 시작 ---")
     
     # B2B 상품만 필터링 (전체 SKU 문자열에서 확인)
-    b2b_mask = df["SKU"].str.contains("\\[B2B\\]", na=False)
-    b2b_df = df[b2b_mask].copy()
+    b2b_mask = df["SKU"].str.contains("[B2B]", regex=False, na=False)
+    b2b_df = df[b2b_mask]
     
     if b2b_df.empty:
         print("✅ 미니학습지: B2B 상품 없음")
@@ -163,12 +163,7 @@ def process_mini_b2b_status_change(df):
     # B2B 상품 상태 변경 (배치 처리)
     print("🔄 미니학습지 B2B 상품 WooCommerce 상태 변경 중...")
     
-    # 환경변수 가져오기
-    base_url = os.getenv('WP_BASE_URL')
-    consumer_key = os.getenv('WP_WOO_CONSUMER_KEY')
-    consumer_secret = os.getenv('WP_WOO_CONSUMER_SECRET')
-    
-    if not all([base_url, consumer_key, consumer_secret]):
+    if not MINI_AVAILABLE:
         print("❌ 미니학습지 WooCommerce API 환경변수가 설정되지 않았습니다")
         return []
     
@@ -176,7 +171,7 @@ def process_mini_b2b_status_change(df):
     order_ids = b2b_df["주문번호"].tolist()
     
     # 배치 업데이트 실행
-    updated_count = update_orders_batch(order_ids, "shipped", base_url, consumer_key, consumer_secret)
+    updated_count = update_orders_batch(order_ids, "shipped", *_MINI_CFG)
     
     print(f"✅ 미니학습지 B2B 상품 {updated_count}개 주문 상태 변경 완료")
     
@@ -193,16 +188,43 @@ def process_mini_status_changes(df):
     
     print("--- 미니학습지 주문상태 변경 처리 시작 ---")
     
+    # SKU 종류 분류 (한 번만 스캔, 디지털 > 예약 > B2B > 실물 우선순위)
+    # Arrow 문자열 SKU는 nullable boolean을 반환하므로 np.select용 bool 배열로 변환
+    sku_kind = pd.Series(np.select(
+        [
+            df["SKU"].str.contains("[디지털]", regex=False, na=False).to_numpy(dtype=bool),
+            df["SKU"].str.contains("[예약상품]", regex=False, na=False).to_numpy(dtype=bool),
+            df["SKU"].str.contains("[B2B]", regex=False, na=False).to_numpy(dtype=bool),
+        ],
+        ["digital", "reservation", "b2b"],
+        default="physical"
+    ), index=df.index)
+    
+    # 주문별 SKU 종류 포함 여부 (groupby 1회)
+    order_flags = pd.DataFrame({
+        "has_digital": sku_kind.eq("digital"),
+        "has_physical": sku_kind.eq("physical"),
+        "has_reservation": sku_kind.eq("reservation"),
+    }).groupby(df["주문번호"]).any()
+    
+    # 혼합 주문 제외: 디지털만 있는 주문 (실물 없음) / 예약만 있는 주문 (디지털/실물 없음)
+    pure_digital_ids = order_flags.index[order_flags["has_digital"] & ~order_flags["has_physical"]]
+    pure_reservation_ids = order_flags.index[
+        order_flags["has_reservation"] & ~order_flags["has_digital"] & ~order_flags["has_physical"]
+    ]
+    
     # SKU 조건별 분류 (정확한 패턴 매칭)
     conditions = {
         "디지털": {
-            "mask": df["SKU"].str.contains("\\[디지털\\]", na=False),  # 전체 SKU에서 확인
+            "mask": sku_kind == "digital",  # 전체 SKU에서 확인
+            "pure_ids": pure_digital_ids,
             "status": "shipped",
             "filename": "배송완료",
             "description": "디지털 상품 (배송완료)"
         },
         "예약": {
-            "mask": df["SKU"].str.contains("[예약상품]", na=False),
+            "mask": sku_kind == "reservation",
+            "pure_ids": pure_reservation_ids,
             "status": "processing", 
             "filename": "처리중",
             "description": "예약 상품 (처리중)"
@@ -215,35 +237,12 @@ def process_mini_status_changes(df):
     # 각 조건별 처리
     for condition_name, config in conditions.items():
         condition_mask = config["mask"]
-        condition_df = df[condition_mask].copy()
+        condition_df = df[condition_mask]
         
         if not condition_df.empty:
-            # 혼합 주문 제외 로직: 디지털과 실물이 섞인 주문 제외
-            
-            # 현재 조건의 주문번호들
-            condition_orders = condition_df["주문번호"].unique()
-            
-            # 각 주문번호별로 혼합 여부 확인
-            pure_orders = []
-            for order_num in condition_orders:
-                order_items = df[df["주문번호"] == order_num]
-                
-                # 해당 주문의 모든 SKU 확인
-                has_digital = order_items["SKU"].str.contains("\\[디지털\\]", na=False).any()
-                has_physical = (~order_items["SKU"].str.contains("\\[디지털\\]", na=False) & 
-                              ~order_items["SKU"].str.contains("[예약상품]", na=False) &
-                              ~order_items["SKU"].str.contains("[B2B]", na=False)).any()
-                
-                # 디지털만 있는 주문 (실물 없음) 또는 예약만 있는 주문만 처리
-                if condition_name == "디지털" and has_digital and not has_physical:
-                    pure_orders.append(order_num)
-                elif condition_name == "예약" and not has_digital and not has_physical:
-                    # 예약 상품만 있는 주문
-                    has_reservation = order_items["SKU"].str.contains("[예약상품]", na=False).any()
-                    if has_reservation:
-                        pure_orders.append(order_num)
-            
-            pure_condition_df = condition_df[condition_df["주문번호"].isin(pure_orders)].copy()
+            # 혼합 주문 제외 로직: 순수 주문의 행만 선택 (주문번호 등장 순서 유지)
+            pure_condition_df = condition_df[condition_df["주문번호"].isin(config["pure_ids"])]
+            pure_orders = pure_condition_df["주문번호"].unique().tolist()
             
             if not pure_orders:
                 print(f"⚠️ 미니학습지 {condition_name}: 혼합 주문으로 인해 처리할 순수 주문 없음")
@@ -251,12 +250,20 @@ def process_mini_status_changes(df):
             if not pure_condition_df.empty:
                 print(f"🔄 미니학습지 {condition_name} 상품 WooCommerce 상태 변경 중...")
                 
-                # WooCommerce에서 실제 주문 상태 변경
-                successful_updates = []
-                for order_num in pure_orders:
-                    success = update_order_status_in_woocommerce(order_num, config["status"])
-                    if success:
-                        successful_updates.append(order_num)
+                # WooCommerce에서 실제 주문 상태 변경 (배치 API)
+                batch_updated = set()
+                if MINI_AVAILABLE:
+                    batch_updated = update_orders_batch_ids(pure_orders, config["status"], *_MINI_CFG)
+                
+                # 배치 API가 처리하지 못한 주문만 개별 PUT으로 재시도 (동시 호출, 세션 연결 재사용)
+                remaining = [order_num for order_num in pure_orders if int(order_num) not in batch_updated]
+                with ThreadPoolExecutor(max_workers=STATUS_UPDATE_WORKERS) as executor:
+                    results = list(executor.map(
+                        lambda order_num: update_order_status_in_woocommerce(order_num, config["status"]),
+                        remaining
+                    ))
+                retried = {order_num for order_num, success in zip(remaining, results) if success}
+                successful_updates = [order_num for order_num in pure_orders if int(order_num) in batch_updated or order_num in retried]
                 
                 if successful_updates:
                     print(f"✅ 미니학습지 {len(successful_updates)}개 주문 상태 변경 완료")
@@ -265,7 +272,7 @@ def process_mini_status_changes(df):
                     successful_df = pure_condition_df[pure_condition_df["주문번호"].isin(successful_updates)].copy()
                     
                     # 주문번호 접두사 추가
-                    successful_df["주문번호"] = successful_df["주문번호"].apply(lambda x: "S" + str(x))
+                    successful_df["주문번호"] = "S" + successful_df["주문번호"].astype(str)
                     
                     csv_path = create_csv_for_condition(
                         successful_df, 
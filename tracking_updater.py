@@ -6,13 +6,16 @@
 """
 import os
 import pandas as pd
-import requests
-import json
+import numpy as np
+import re
+import time
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from common_utils import should_skip_today
+from common_utils import should_skip_today, get_http_session, dumps_json, post_with_retry, BATCH_UPDATE_SIZE, STATUS_UPDATE_WORKERS
 from email_sender import send_processing_result_email
 
 load_dotenv()
@@ -23,8 +26,50 @@ SCOPES = [
     'https://www.googleapis.com/auth/spreadsheets.readonly'
 ]
 
+# 파일명/주소 판별용 정규식 (모듈 로드 시 1회 컴파일)
+_RE_B2B_NAME = re.compile(r'(?:^|[ _-])b2b(?:$|[ ._-])')
+_RE_HANGUL = re.compile(r'[가-힣]')
+_RE_LATIN = re.compile(r'[A-Za-z]')
+
+# 송장 업데이트 배치 크기 (WooCommerce 배치 API 최대 100건, 느린 서버는 WOO_BATCH_SIZE로 축소)
+TRACKING_BATCH_SIZE = int(os.getenv('WOO_BATCH_SIZE', BATCH_UPDATE_SIZE))
+# 배치 요청 타임아웃 (초, 100건 처리 기준)
+TRACKING_BATCH_TIMEOUT = 60
+
+# Sheets API 요청 재시도 횟수 (연결 오류/429/5xx, API 클라이언트 내장 지수 백오프)
+SHEETS_NUM_RETRIES = 5
+
+# 송장 시트 목록 캐시 ((폴더 ID, 공유 드라이브 ID, 날짜) → (조회 시각, 시트 목록), 10분 후 만료)
+TRACKING_SHEET_LIST_TTL = 600
+_tracking_sheet_cache = {}
+
+# 송장 시트 조회 최대 행 수 (헤더 포함)
+TRACKING_SHEET_MAX_ROWS = 2000
+
+# 송장 시트 동시 다운로드 수
+SHEET_DOWNLOAD_WORKERS = 4
+
+# 인증 정보 (다운로드 스레드별 Sheets 서비스 생성용)
+_google_credentials = None
+# 다운로드 스레드별 Sheets 서비스 (httplib2 연결은 스레드 간 공유 불가)
+_sheets_local = threading.local()
+
+def _build_service(api_name, api_version, credentials):
+    """Google API 서비스 생성 (라이브러리 내장 discovery 문서 사용, 네트워크 조회/파일 캐시 없음)"""
+    return build(api_name, api_version, credentials=credentials,
+                 cache_discovery=False, static_discovery=True)
+
+def _thread_sheets_service():
+    """현재 다운로드 스레드 전용 Sheets 서비스 반환 (스레드당 1회 생성)"""
+    service = getattr(_sheets_local, 'service', None)
+    if service is None:
+        service = _build_service('sheets', 'v4', _google_credentials)
+        _sheets_local.service = service
+    return service
+
 def authenticate_google_services():
     """Google Drive 및 Sheets API 인증"""
+    global _google_credentials
     
     try:
         # Google Service Account 환경변수 로드
@@ -65,9 +110,10 @@ def authenticate_google_services():
         credentials = service_account.Credentials.from_service_account_info(
             service_account_info, scopes=SCOPES
         )
+        _google_credentials = credentials
         
-        drive_service = build('drive', 'v3', credentials=credentials)
-        sheets_service = build('sheets', 'v4', credentials=credentials)
+        drive_service = _build_service('drive', 'v3', credentials)
+        sheets_service = _build_service('sheets', 'v4', credentials)
         
         print("✅ Google API 인증 성공")
         return drive_service, sheets_service
@@ -77,30 +123,46 @@ def authenticate_google_services():
         return None, None
 
 
-def find_today_tracking_sheets(drive_service, folder_id, shared_drive_id, date_prefix=None):
-    """오늘 날짜로 시작하는 송장 시트 찾기"""
+def find_today_tracking_sheets(drive_service, folder_id, shared_drive_id, date_prefix=None, refresh=False):
+    """오늘 날짜로 시작하는 송장 시트 찾기 (10분 캐시, refresh=True면 다시 조회)"""
     
     if not date_prefix:
         # 오늘 날짜를 YYMMDD 형식으로 생성
         today = datetime.now()
         date_prefix = today.strftime('%y%m%d')  # 250915 형태
     
+    # 같은 폴더/날짜를 다시 조회하면 캐시 사용 (재실행 시 Drive 조회 쿼터 절약)
+    cache_key = (folder_id, shared_drive_id, date_prefix)
+    cached = _tracking_sheet_cache.get(cache_key)
+    if cached is not None and not refresh and time.time() - cached[0] < TRACKING_SHEET_LIST_TTL:
+        print(f"📁 {date_prefix} 송장 시트 목록 캐시 사용: {len(cached[1])}개")
+        return cached[1]
+    
     print(f"🔍 {date_prefix}로 시작하는 송장 시트 검색...")
     
     try:
         query = f"'{folder_id}' in parents and trashed=false and mimeType='application/vnd.google-apps.spreadsheet' and name contains '{date_prefix}'"
         
-        results = drive_service.files().list(
-            q=query,
-            corpora="drive",
-            driveId=shared_drive_id,
-            supportsAllDrives=True,
-            includeItemsFromAllDrives=True,
-            pageSize=50,
-            fields="files(id, name, mimeType, modifiedTime)"
-        ).execute()
-        
-        files = results.get('files', [])
+        # 필요한 필드만 요청 (mimeType은 쿼리에서 이미 제한), 결과가 많으면 다음 페이지까지 조회
+        files = []
+        page_token = None
+        while True:
+            results = drive_service.files().list(
+                q=query,
+                corpora="drive",
+                driveId=shared_drive_id,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True,
+                pageSize=100,
+                orderBy="name",
+                fields="nextPageToken, files(id, name, modifiedTime)",
+                pageToken=page_token
+            ).execute()
+            
+            files.extend(results.get('files', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
         
         print(f"📁 {date_prefix} 관련 파일 수: {len(files)}개")
         
@@ -108,17 +170,13 @@ def find_today_tracking_sheets(drive_service, folder_id, shared_drive_id, date_p
         tracking_sheets = []
         for file in files:
             file_name = file['name']
-            mime_type = file['mimeType']
             
             # B2B/본사 파일 필터링 개선
-            import re
             file_name_lower = file_name.lower()
-            is_b2b = re.search(r'(?:^|[ _-])b2b(?:$|[ ._-])', file_name_lower)
+            is_b2b = _RE_B2B_NAME.search(file_name_lower)
             is_office = '본사' in file_name
             
-            if ('spreadsheet' in mime_type and 
-                file_name.startswith(date_prefix) and 
-                not is_b2b and not is_office):
+            if file_name.startswith(date_prefix) and not is_b2b and not is_office:
                 
                 tracking_sheets.append(file)
                 print(f"🎯 송장 시트 발견: {file_name}")
@@ -129,6 +187,10 @@ def find_today_tracking_sheets(drive_service, folder_id, shared_drive_id, date_p
             elif is_office:
                 print(f"⚠️ 본사 파일 제외: {file_name}")
         
+        # 시트가 아직 올라오지 않은 경우(빈 결과)는 캐시하지 않음
+        if tracking_sheets:
+            _tracking_sheet_cache[cache_key] = (time.time(), tracking_sheets)
+        
         return tracking_sheets
         
     except Exception as e:
@@ -136,89 +198,83 @@ def find_today_tracking_sheets(drive_service, folder_id, shared_drive_id, date_p
         return []
 
 
-def download_tracking_data(sheets_service, spreadsheet_id, max_retries=3):
-    """송장 시트에서 데이터 다운로드 (재시도 로직 포함)"""
+def download_tracking_data(sheets_service, spreadsheet_id, num_retries=SHEETS_NUM_RETRIES):
+    """송장 시트에서 데이터 다운로드 (연결 오류/429/5xx는 API 클라이언트가 지수 백오프로 재시도)"""
     
-    import time
-    
-    for attempt in range(max_retries):
-        try:
-            if attempt > 0:
-                wait_time = 2 ** attempt  # 지수적 백오프: 2초, 4초, 8초
-                print(f"🔄 재시도 {attempt + 1}/{max_retries} (대기: {wait_time}초)")
-                time.sleep(wait_time)
-            
-            # 스프레드시트 정보 조회 (타임아웃 설정)
-            spreadsheet = sheets_service.spreadsheets().get(
-                spreadsheetId=spreadsheet_id
-            ).execute()
-            
-            sheet_title = spreadsheet['properties']['title']
-            print(f"📊 송장 시트: {sheet_title}")
-            
-            # 첫 번째 시트 데이터 조회
-            sheets = spreadsheet.get('sheets', [])
-            if not sheets:
-                print("❌ 시트가 없습니다")
-                return None
-            
-            target_sheet = sheets[0]['properties']['title']
-            print(f"🎯 데이터 조회 시트: {target_sheet}")
-            
-            # 시트 데이터 조회 (A:Z 범위, 작은 범위로 제한)
-            range_name = f"{target_sheet}!A1:Z1000"  # 1000행으로 제한
-            
-            result = sheets_service.spreadsheets().values().get(
-                spreadsheetId=spreadsheet_id,
-                range=range_name
-            ).execute()
-            
-            values = result.get('values', [])
-            
-            if not values or len(values) <= 1:
-                print("📭 송장 데이터가 없습니다")
-                return None
-            
-            print(f"✅ 송장 데이터 조회 성공: {len(values)}행")
-            
-            # DataFrame으로 변환
-            headers = values[0]
-            data_rows = values[1:]
-            
-            # 행 길이 정규화
-            normalized_rows = []
-            for row in data_rows:
-                while len(row) < len(headers):
-                    row.append('')
-                normalized_rows.append(row[:len(headers)])
-            
-            df = pd.DataFrame(normalized_rows, columns=headers)
-            
-            print(f"📊 DataFrame 생성: {df.shape[0]}행 x {df.shape[1]}열")
-            print(f"📋 컬럼: {list(df.columns)}")
-            
-            return df
-            
-        except Exception as e:
-            error_msg = str(e)
-            print(f"❌ 시도 {attempt + 1} 실패: {error_msg}")
-            
-            # Broken pipe, 연결 오류, 타임아웃 등은 재시도 가능
-            if any(keyword in error_msg.lower() for keyword in 
-                   ['broken pipe', 'connection', 'timeout', 'network', 'errno 32']):
-                if attempt < max_retries - 1:
-                    print("🔄 네트워크 오류 감지 - 재시도 예정")
-                    continue
-            
-            # 권한 오류, 파일 없음 등은 재시도 불가
-            if any(keyword in error_msg.lower() for keyword in 
-                   ['permission', 'not found', '404', '403', '401']):
-                print("❌ 복구 불가능한 오류 - 재시도 중단")
-                break
-    
-    print(f"❌ 모든 재시도 실패: {spreadsheet_id}")
-    return None
+    try:
+        # 스프레드시트 정보 조회 (문서/시트 제목만 요청, 셀 서식·병합 등 메타데이터 제외)
+        spreadsheet = sheets_service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields='properties.title,sheets.properties(title,gridProperties.rowCount)'
+        ).execute(num_retries=num_retries)
+        
+        sheet_title = spreadsheet['properties']['title']
+        print(f"📊 송장 시트: {sheet_title}")
+        
+        # 첫 번째 시트 데이터 조회
+        sheets = spreadsheet.get('sheets', [])
+        if not sheets:
+            print("❌ 시트가 없습니다")
+            return None
+        
+        target_properties = sheets[0]['properties']
+        target_sheet = target_properties['title']
+        print(f"🎯 데이터 조회 시트: {target_sheet}")
+        
+        # 시트 데이터 조회 (A:Z 범위, 시트의 실제 행 수까지만 요청, 최대 TRACKING_SHEET_MAX_ROWS행)
+        row_count = target_properties.get('gridProperties', {}).get('rowCount', 1000)
+        range_name = f"{target_sheet}!A1:Z{min(row_count, TRACKING_SHEET_MAX_ROWS)}"
+        
+        result = sheets_service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id,
+            range=range_name
+        ).execute(num_retries=num_retries)
+        
+        values = result.get('values', [])
+        
+        if not values or len(values) <= 1:
+            print("📭 송장 데이터가 없습니다")
+            return None
+        
+        print(f"✅ 송장 데이터 조회 성공: {len(values)}행")
+        
+        # DataFrame으로 변환
+        headers = values[0]
+        data_rows = values[1:]
+        
+        # 행 길이 정규화 (빈 문자열로 채운 배열에 행별 슬라이스 복사, 짧은 행은 뒤가 빈 값)
+        width = len(headers)
+        normalized_rows = np.full((len(data_rows), width), '', dtype=object)
+        for i, row in enumerate(data_rows):
+            n = min(len(row), width)
+            normalized_rows[i, :n] = row[:n]
+        
+        df = pd.DataFrame(normalized_rows, columns=headers)
+        
+        print(f"📊 DataFrame 생성: {df.shape[0]}행 x {df.shape[1]}열")
+        print(f"📋 컬럼: {list(df.columns)}")
+        
+        return df
+        
+    except Exception as e:
+        print(f"❌ 송장 데이터 다운로드 실패: {spreadsheet_id} - {e}")
+        return None
+
+
+def _auth_kwargs(base_url, consumer_key, consumer_secret):
+    """WooCommerce 인증 요청 인자 (HTTPS는 URL 파라미터, HTTP는 Basic Auth)"""
+    if base_url.startswith('https://'):
+        return {'params': {'consumer_key': consumer_key, 'consumer_secret': consumer_secret}}
+    return {'auth': (consumer_key, consumer_secret)}
 
+def _msex_meta_data(carrier_code, carrier_name, tracking_number, register_date):
+    """엠샵 플러그인 송장 메타 데이터 (택배사 코드/이름, 송장번호, 등록 일시)"""
+    return [
+        {"key": "_msex_dlv_code", "value": carrier_code},
+        {"key": "_msex_dlv_name", "value": carrier_name},
+        {"key": "_msex_sheet_no", "value": tracking_number},
+        {"key": "_msex_register_date", "value": register_date}
+    ]
 
 def add_customer_note_for_ems(order_id, tracking_number, site="mini"):
     """EMS 주문에 고객 메모 추가"""
@@ -260,27 +316,13 @@ def add_customer_note_for_ems(order_id, tracking_number, site="mini"):
     }
     
     try:
-        if base_url.startswith('https://'):
-            params = {
-                'consumer_key': consumer_key,
-                'consumer_secret': consumer_secret
-            }
-            response = requests.post(
-                notes_url,
-                params=params,
-                headers={'Content-Type': 'application/json'},
-                data=json.dumps(note_data),
-                timeout=15
-            )
-        else:
-            auth = (consumer_key, consumer_secret)
-            response = requests.post(
-                notes_url,
-                auth=auth,
-                headers={'Content-Type': 'application/json'},
-                data=json.dumps(note_data),
-                timeout=15
-            )
+        response = get_http_session().post(
+            notes_url,
+            headers={'Content-Type': 'application/json'},
+            data=dumps_json(note_data),
+            timeout=15,
+            **_auth_kwargs(base_url, consumer_key, consumer_secret)
+        )
         
         if response.status_code == 201:
             print(f"✅ EMS 고객 메모 추가 성공: 주문 {order_id}")
@@ -294,8 +336,8 @@ def add_customer_note_for_ems(order_id, tracking_number, site="mini"):
         print(f"❌ EMS 고객 메모 추가 오류: {e}")
         return False
 
-def update_woocommerce_tracking(order_id, tracking_number, carrier_code="HANJIN", carrier_name="한진택배", site="mini"):
-    """WooCommerce 주문에 송장번호 업데이트 (엠샵 플러그인 연동)"""
+def update_woocommerce_tracking(order_id, tracking_number, carrier_code="HANJIN", carrier_name="한진택배", site="mini", status=None, register_date=None):
+    """WooCommerce 주문에 송장번호 업데이트 (엠샵 플러그인 연동, status 지정 시 주문상태도 변경)"""
     
     # 사이트별 환경변수
     if site == "mini":
@@ -318,53 +360,22 @@ def update_woocommerce_tracking(order_id, tracking_number, carrier_code="HANJIN"
     
     order_url = f"{base_url}/wp-json/wc/v3/orders/{order_id}"
     
-    # 현재 날짜
-    register_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    # 엠샵 플러그인 메타 키들
-    meta_data = [
-        {
-            "key": "_msex_dlv_code",
-            "value": carrier_code
-        },
-        {
-            "key": "_msex_dlv_name", 
-            "value": carrier_name
-        },
-        {
-            "key": "_msex_sheet_no",
-            "value": tracking_number
-        },
-        {
-            "key": "_msex_register_date",
-            "value": register_date
-        }
-    ]
+    # 송장 등록 일시 (지정하지 않으면 현재 시각)
+    if register_date is None:
+        register_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
-    update_data = {"meta_data": meta_data}
+    update_data = {"meta_data": _msex_meta_data(carrier_code, carrier_name, tracking_number, register_date)}
+    if status:
+        update_data["status"] = status
     
     try:
-        if base_url.startswith('https://'):
-            params = {
-                'consumer_key': consumer_key,
-                'consumer_secret': consumer_secret
-            }
-            response = requests.put(
-                order_url,
-                params=params,
-                headers={'Content-Type': 'application/json'},
-                data=json.dumps(update_data),
-                timeout=15
-            )
-        else:
-            auth = (consumer_key, consumer_secret)
-            response = requests.put(
-                order_url,
-                auth=auth,
-                headers={'Content-Type': 'application/json'},
-                data=json.dumps(update_data),
-                timeout=15
-            )
+        response = get_http_session().put(
+            order_url,
+            headers={'Content-Type': 'application/json'},
+            data=dumps_json(update_data),
+            timeout=15,
+            **_auth_kwargs(base_url, consumer_key, consumer_secret)
+        )
         
         if response.status_code == 200:
             print(f"✅ 주문 {order_id} 송장번호 업데이트 성공!")
@@ -394,6 +405,9 @@ def process_tracking_updates(date_prefix=None):
     print("=== 물류창고 송장번호 업데이트 시스템 ===")
     print(f"🎯 처리 날짜: {date_prefix}")
     
+    # 송장 등록 일시 (한 번의 실행에서 등록하는 모든 주문에 같은 값 사용)
+    register_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
     # 결과 수집 변수
     total_updated = 0
     total_failed = 0
@@ -432,17 +446,25 @@ def process_tracking_updates(date_prefix=None):
     
     print(f"✅ {len(tracking_sheets)}개 송장 시트 발견")
     
-    # 3단계: 각 시트 처리
-    for sheet_info in tracking_sheets:
+    # 3단계: 송장 데이터 다운로드 (시트끼리 독립적이므로 동시 조회)
+    # 첫 번째 시트는 인증 시 만든 Sheets 서비스를 사용하고, 나머지는 스레드별 서비스 사용 (한 서비스를 동시에 쓰지 않음)
+    print(f"\n3️⃣ 송장 시트 {len(tracking_sheets)}개 다운로드...")
+    with ThreadPoolExecutor(max_workers=min(SHEET_DOWNLOAD_WORKERS, len(tracking_sheets))) as executor:
+        sheet_frames = list(executor.map(
+            lambda indexed: download_tracking_data(
+                sheets_service if indexed[0] == 0 else _thread_sheets_service(),
+                indexed[1]['id']
+            ),
+            enumerate(tracking_sheets)
+        ))
+    
+    # 각 시트 처리
+    for sheet_info, df in zip(tracking_sheets, sheet_frames):
         processed_sheets += 1
         sheet_name = sheet_info['name']
-        sheet_id = sheet_info['id']
         
         print(f"\n3️⃣ 송장 시트 처리: {sheet_name}")
         
-        # 송장 데이터 다운로드
-        df = download_tracking_data(sheets_service, sheet_id)
-        
         if df is None:
             error_msg = f"{sheet_name} 데이터 다운로드 실패"
             print(f"❌ {error_msg}")
@@ -502,54 +524,49 @@ def process_tracking_updates(date_prefix=None):
         # 4단계: 중복 주문 제거 및 배치 처리 준비
         print(f"\n4️⃣ 송장번호 업데이트 준비...")
         
-        # 중복 제거를 위한 딕셔너리 (주문번호 → 송장번호)
-        order_tracking_map = {}
-        
-        for idx, row in df.iterrows():
-            order_number = str(row['주문번호']).strip()
-            tracking_number = str(row['송장번호']).strip()
-            
-            # 빈 데이터 건너뛰기
-            if not order_number or not tracking_number or tracking_number.lower() in ['nan', 'none', '']:
-                continue
-            
-            # 주문번호 정제 및 사이트 구분
-            clean_order_id, site = parse_order_number(order_number)
-            if not clean_order_id:
-                continue
-            
-            # 배송 유형 및 택배사 정보
-            is_international = determine_shipping_type(row)
-            carrier_code, carrier_name = get_carrier_info_from_tracking(tracking_number, is_international)
-            
-            # 중복 제거: 같은 주문번호는 마지막 송장번호 사용
-            order_key = f"{site}_{clean_order_id}"
-            order_tracking_map[order_key] = {
-                'order_id': clean_order_id,
-                'tracking_number': tracking_number,
-                'carrier_code': carrier_code,
-                'carrier_name': carrier_name,
-                'site': site,
-                'original_order': order_number,
-                'shipping_type': "해외" if is_international else "국내"
-            }
+        # 주문번호/송장번호 정리 및 사이트 구분 (행 단위 반복 대신 컬럼 단위 벡터 연산)
+        order_numbers = df['주문번호'].astype(str).str.strip()
+        tracking_numbers = df['송장번호'].astype(str).str.strip()
+        sites = order_numbers.str[:1].map({'S': 'mini', 'D': 'dok'})
+        clean_order_ids = order_numbers.str[1:].str.split('-').str[0]
+        
+        # 빈 데이터 건너뛰기
+        valid = (order_numbers != '') & ~tracking_numbers.str.lower().isin(['nan', 'none', ''])
+        for order_number in order_numbers[valid & sites.isna()]:
+            print(f"⚠️ 접두사 없는 주문번호 건너뛰기: {order_number}")
+        valid &= sites.notna() & (clean_order_ids != '')
+        
+        # 배송 유형 (국내/해외) 일괄 판별
+        is_international = international_mask(df)
+        
+        # 택배사 정보 (get_carrier_info_from_tracking과 같은 규칙: 해외는 EMS, 국내는 대한통운)
+        international = is_international[valid].to_numpy(dtype=bool)
+        
+        # 주문별 송장 정보 (같은 사이트의 같은 주문번호는 마지막 송장번호 사용, 해시 기반 중복 제거)
+        updates = pd.DataFrame({
+            'order_id': clean_order_ids[valid],
+            'tracking_number': tracking_numbers[valid],
+            'carrier_code': np.where(international, 'EMS', 'CJGLS'),
+            'carrier_name': np.where(international, 'EMS', '대한통운'),
+            'site': sites[valid],
+            'original_order': order_numbers[valid],
+            'shipping_type': np.where(international, '해외', '국내'),
+        }).drop_duplicates(subset=['site', 'order_id'], keep='last')
+        
+        # 사이트별 주문 목록 (한 배치에 두 사이트가 섞이지 않도록 분리)
+        site_updates = {
+            site: group.to_dict('records')
+            for site, group in updates.groupby('site', sort=False)
+        }
         
-        print(f"📊 중복 제거 후 처리할 주문: {len(order_tracking_map)}개")
+        print(f"📊 중복 제거 후 처리할 주문: {len(updates)}개")
         
-        # 5단계: 배치 처리로 업데이트
+        # 5단계: 사이트별 배치 처리로 업데이트
         print(f"\n5️⃣ 배치 처리 시작...")
-        batch_updates = list(order_tracking_map.values())
-        
-        for i in range(0, len(batch_updates), 20):  # 20개씩 배치
-            batch = batch_updates[i:i+20]
-            print(f"📦 배치 {i//20 + 1}/{(len(batch_updates)-1)//20 + 1}: {len(batch)}개 주문 처리 중...")
-            
-            batch_success, batch_failed = update_woocommerce_batch(batch)
-            total_updated += batch_success
-            total_failed += batch_failed
-            
-            if batch_failed > 0:
-                errors.append(f"배치 {i//20 + 1}: {batch_failed}개 실패")
+        batch_success, batch_failed, batch_errors = dispatch_site_batches(site_updates, register_date)
+        total_updated += batch_success
+        total_failed += batch_failed
+        errors.extend(batch_errors)
     
     print(f"\n🎉 배치 처리 완료!")
     print(f"✅ 성공: {total_updated}개")
@@ -640,27 +657,13 @@ def update_woocommerce_tracking_DEPRECATED(order_id, tracking_number, carrier_co
     }
     
     try:
-        if base_url.startswith('https://'):
-            params = {
-                'consumer_key': consumer_key,
-                'consumer_secret': consumer_secret
-            }
-            response = requests.put(
-                order_url,
-                params=params,
-                headers={'Content-Type': 'application/json'},
-                data=json.dumps(update_data),
-                timeout=15
-            )
-        else:
-            auth = (consumer_key, consumer_secret)
-            response = requests.put(
-                order_url,
-                auth=auth,
-                headers={'Content-Type': 'application/json'},
-                data=json.dumps(update_data),
-                timeout=15
-            )
+        response = get_http_session().put(
+            order_url,
+            headers={'Content-Type': 'application/json'},
+            data=dumps_json(update_data),
+            timeout=15,
+            **_auth_kwargs(base_url, consumer_key, consumer_secret)
+        )
         
         if response.status_code == 200:
             return True
@@ -708,6 +711,20 @@ def get_carrier_info_from_tracking(tracking_number, is_international=False):
     return ("CJGLS", "대한통운")
 
 
+# 주소에 단어로 포함되면 해외 배송으로 보는 국가/도시 키워드 ('US'는 'BUS' 등 오탐이 많아 제외, USA로 판별)
+OVERSEAS_KEYWORDS = [
+    'USA', 'UNITED STATES', 'AMERICA',
+    'JAPAN', 'TOKYO', 'OSAKA', 'JP', 
+    'CHINA', 'BEIJING', 'SHANGHAI', 'CN',
+    'SINGAPORE', 'SG', 'TAIWAN', 'TW',
+    'HONG KONG', 'HK', 'VIETNAM', 'VN'
+]
+# 키워드 전체를 한 번에 검사하는 정규식 (대소문자 무시, 단어 경계 기준)
+_RE_OVERSEAS = re.compile(
+    r'\b(?:' + '|'.join(re.escape(keyword) for keyword in OVERSEAS_KEYWORDS) + r')\b',
+    re.IGNORECASE
+)
+
 def determine_shipping_type(row):
     """배송 유형 결정 (국내/해외) - 개선된 로직"""
     
@@ -720,23 +737,12 @@ def determine_shipping_type(row):
     
     # 2순위: 주소에 해외 국가명 포함 확인
     if address:
-        import re
-        address_upper = address.upper()
-        overseas_keywords = [
-            'USA', 'UNITED STATES', 'AMERICA', 'US',
-            'JAPAN', 'TOKYO', 'OSAKA', 'JP', 
-            'CHINA', 'BEIJING', 'SHANGHAI', 'CN',
-            'SINGAPORE', 'SG', 'TAIWAN', 'TW',
-            'HONG KONG', 'HK', 'VIETNAM', 'VN'
-        ]
-        
-        for keyword in overseas_keywords:
-            if keyword in address_upper:
-                return True  # 해외
+        if _RE_OVERSEAS.search(address):
+            return True  # 해외
         
         # 3순위: 한글 포함 여부 (보조 판단)
-        has_korean = bool(re.search(r'[가-힣]', address))
-        has_english = bool(re.search(r'[A-Za-z]', address))
+        has_korean = bool(_RE_HANGUL.search(address))
+        has_english = bool(_RE_LATIN.search(address))
         
         # 영문만 있고 한글이 없으면 해외 가능성 높음 (하지만 확실하지 않음)
         if has_english and not has_korean and len(address) > 10:
@@ -745,8 +751,52 @@ def determine_shipping_type(row):
     return False  # 국내 (기본값)
 
 
-def update_woocommerce_batch(batch_data):
-    """WooCommerce Batch API를 사용한 대량 업데이트"""
+def international_mask(df):
+    """배송 유형 일괄 판별 (determine_shipping_type의 벡터 연산 버전, 해외 주문이면 True)"""
+    blank = pd.Series('', index=df.index)
+    address = df['배송지주소'].astype(str).str.strip() if '배송지주소' in df.columns else blank
+    country_code = df['국가코드'].astype(str).str.strip() if '국가코드' in df.columns else blank
+    
+    # 1순위: 국가코드
+    by_country = country_code.str.upper() != 'KR'
+    
+    # 2순위: 주소에 해외 국가명 포함
+    by_keyword = address.str.contains(_RE_OVERSEAS)
+    
+    # 3순위: 영문만 있고 한글이 없는 긴 주소 (낮은 확신도)
+    by_script = (
+        address.str.contains(_RE_LATIN) &
+        ~address.str.contains(_RE_HANGUL) &
+        (address.str.len() > 10)
+    )
+    
+    return by_country.where(country_code != '', by_keyword | by_script)
+
+
+def dispatch_site_batches(site_updates, register_date=None):
+    """사이트별 송장 업데이트 목록을 배치 크기 단위로 전송 (성공 수, 실패 수, 오류 메시지 목록 반환)"""
+    total_success = 0
+    total_failed = 0
+    errors = []
+    
+    # 사이트마다 꽉 찬 배치로 나누어 전송 (한 배치에 두 사이트가 섞이지 않음)
+    for site, batch_updates in site_updates.items():
+        total_batches = (len(batch_updates) - 1) // TRACKING_BATCH_SIZE + 1
+        for batch_num, i in enumerate(range(0, len(batch_updates), TRACKING_BATCH_SIZE), start=1):
+            batch = batch_updates[i:i + TRACKING_BATCH_SIZE]
+            print(f"📦 {site} 배치 {batch_num}/{total_batches}: {len(batch)}개 주문 처리 중...")
+            
+            batch_success, batch_failed = process_batch_for_site(batch, site, register_date)
+            total_success += batch_success
+            total_failed += batch_failed
+            
+            if batch_failed > 0:
+                errors.append(f"{site} 배치 {batch_num}: {batch_failed}개 실패")
+    
+    return total_success, total_failed, errors
+
+def update_woocommerce_batch(batch_data, register_date=None):
+    """WooCommerce Batch API를 사용한 대량 업데이트 (register_date: 송장 등록 일시, 기본값 현재 시각)"""
     if not batch_data:
         return 0, 0
     
@@ -759,19 +809,19 @@ def update_woocommerce_batch(batch_data):
     
     # 미니학습지 배치 처리
     if mini_orders:
-        success, failed = process_batch_for_site(mini_orders, 'mini')
+        success, failed = process_batch_for_site(mini_orders, 'mini', register_date)
         total_success += success
         total_failed += failed
     
     # 독독독 배치 처리
     if dok_orders:
-        success, failed = process_batch_for_site(dok_orders, 'dok')
+        success, failed = process_batch_for_site(dok_orders, 'dok', register_date)
         total_success += success
         total_failed += failed
     
     return total_success, total_failed
 
-def process_batch_for_site(orders, site):
+def process_batch_for_site(orders, site, register_date=None):
     """특정 사이트의 주문들을 배치로 처리"""
     if site == "mini":
         base_url = os.getenv('WP_BASE_URL')
@@ -788,81 +838,47 @@ def process_batch_for_site(orders, site):
         print(f"❌ {site} 환경변수 누락")
         return 0, len(orders)
     
-    # 배치 데이터 생성
-    batch_update = {
-        "update": []
-    }
+    if register_date is None:
+        register_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
-    register_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    for order in orders:
-        meta_data = [
-            {"key": "_msex_dlv_code", "value": order['carrier_code']},
-            {"key": "_msex_dlv_name", "value": order['carrier_name']},
-            {"key": "_msex_sheet_no", "value": order['tracking_number']},
-            {"key": "_msex_register_date", "value": register_date}
+    # 배치 데이터 생성 (엠샵 메타 + 주문상태 shipping, 주문별 값만 채워 한 번에 구성)
+    batch_update = {
+        "update": [
+            {
+                "id": int(order['order_id']),
+                "meta_data": _msex_meta_data(order['carrier_code'], order['carrier_name'],
+                                             order['tracking_number'], register_date),
+                "status": "shipping"
+            }
+            for order in orders
         ]
-        
-        batch_update["update"].append({
-            "id": int(order['order_id']),
-            "meta_data": meta_data,
-            "status": "shipping"
-        })
-        
-        # EMS인 경우 고객 메모 추가 (배치 처리 후 개별 처리)
-        if order['carrier_code'] == 'EMS':
-            order['needs_ems_note'] = True
+    }
     
-    # API 호출
+    # API 호출 (배치로 변경된 주문 ID 수집)
+    updated_ids = set()
     try:
         batch_url = f"{base_url}/wp-json/wc/v3/orders/batch"
+        session = get_http_session()
+        headers = {'Content-Type': 'application/json'}
+        body = dumps_json(batch_update)
         
-        if base_url.startswith('https://'):
-            params = {'consumer_key': consumer_key, 'consumer_secret': consumer_secret}
-            response = requests.post(batch_url, params=params, json=batch_update, timeout=30)
-        else:
-            auth = (consumer_key, consumer_secret)
-            response = requests.post(batch_url, auth=auth, json=batch_update, timeout=30)
+        response = post_with_retry(session, batch_url, headers=headers, data=body, timeout=TRACKING_BATCH_TIMEOUT,
+                                    **_auth_kwargs(base_url, consumer_key, consumer_secret))
         
         if response.status_code == 200:
             result = response.json()
             update_results = result.get('update', [])
             
-            # 실제 성공/실패 개수 계산
-            success_count = 0
-            failed_count = 0
-            
             for item in update_results:
                 if 'error' in item:
-                    failed_count += 1
                     error_msg = item.get('error', {}).get('message', 'Unknown error')
                     print(f"   ⚠️ 주문 {item.get('id', '?')} 실패: {error_msg}")
                 elif 'id' in item:
-                    success_count += 1
+                    updated_ids.add(int(item['id']))
                 else:
-                    failed_count += 1
                     print(f"   ⚠️ 알 수 없는 응답: {item}")
             
-            print(f"   ✅ {site} 배치 완료: {success_count}개 성공, {failed_count}개 실패")
-            
-            # EMS 주문에 고객 메모 추가 (배치 처리 성공한 경우만)
-            ems_note_success = 0
-            ems_note_failed = 0
-            
-            for i, order in enumerate(orders):
-                if order.get('needs_ems_note') and i < len(update_results):
-                    result_item = update_results[i]
-                    # 해당 주문이 성공적으로 업데이트된 경우에만 메모 추가
-                    if 'error' not in result_item and 'id' in result_item:
-                        if add_customer_note_for_ems(order['order_id'], order['tracking_number'], site):
-                            ems_note_success += 1
-                        else:
-                            ems_note_failed += 1
-            
-            if ems_note_success > 0 or ems_note_failed > 0:
-                print(f"   📝 EMS 고객 메모: {ems_note_success}개 성공, {ems_note_failed}개 실패")
-            
-            return success_count, failed_count
+            print(f"   ✅ {site} 배치 완료: {len(updated_ids)}개 성공, {len(orders) - len(updated_ids)}개 실패")
         else:
             print(f"   ❌ {site} 배치 실패: {response.status_code}")
             try:
@@ -870,11 +886,42 @@ def process_batch_for_site(orders, site):
                 print(f"   상세: {error_detail}")
             except:
                 print(f"   응답: {response.text[:200]}")
-            return 0, len(orders)
             
     except Exception as e:
         print(f"   ❌ {site} 배치 오류: {e}")
-        return 0, len(orders)
+    
+    # 배치 API가 처리하지 못한 주문만 개별 PUT으로 재시도 (동시 호출, 세션 연결 재사용)
+    remaining = [order for order in orders if int(order['order_id']) not in updated_ids]
+    if remaining:
+        print(f"   🔄 {site} 개별 업데이트 재시도: {len(remaining)}개 주문")
+        with ThreadPoolExecutor(max_workers=STATUS_UPDATE_WORKERS) as executor:
+            results = list(executor.map(
+                lambda order: update_woocommerce_tracking(
+                    order['order_id'], order['tracking_number'], order['carrier_code'],
+                    order['carrier_name'], site, status="shipping", register_date=register_date
+                ),
+                remaining
+            ))
+        updated_ids.update(int(order['order_id']) for order, success in zip(remaining, results) if success)
+    
+    success_count = len(updated_ids)
+    failed_count = len(orders) - success_count
+    
+    # EMS 주문에 고객 메모 추가 (송장 업데이트 성공한 주문만, 동시 호출)
+    ems_orders = [
+        order for order in orders
+        if order['carrier_code'] == 'EMS' and int(order['order_id']) in updated_ids
+    ]
+    if ems_orders:
+        with ThreadPoolExecutor(max_workers=STATUS_UPDATE_WORKERS) as executor:
+            results = list(executor.map(
+                lambda order: add_customer_note_for_ems(order['order_id'], order['tracking_number'], site),
+                ems_orders
+            ))
+        ems_note_success = sum(results)
+        print(f"   📝 EMS 고객 메모: {ems_note_success}개 성공, {len(results) - ems_note_success}개 실패")
+    
+    return success_count, failed_count
 
 
 if __name__ == "__main__":